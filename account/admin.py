@@ -1 +1,25 @@
-# Register your models here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+
+from .utils import ActivationMailFormMixin, BulkActivationMailer
+
+User = get_user_model()
+
+
+# let's add the bulk resend of the activation mails to the admin of the users
+class AccountUserAdmin(UserAdmin):
+    actions = ['resend_activation_mail']
+
+    def resend_activation_mail(self, request, queryset):
+        site_context = ActivationMailFormMixin().get_site_context(request)
+        mailer = BulkActivationMailer(site_context, rate=getattr(settings, 'ACTIVATION_RESEND_RATE', None))
+        queued = mailer.send(queryset)
+        self.message_user(request, 'Queued the activation mail of {} inactive users.'.format(queued))
+
+    resend_activation_mail.short_description = 'Resend the activation mail to the selected inactive users'
+
+
+admin.site.unregister(User)
+admin.site.register(User, AccountUserAdmin)
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
 
 
 class AccountConfig(AppConfig):
     name = 'account'
+
+    def ready(self):
+        from .signals import profile_changed, remember_profile_slug, restore_email_index, user_changed
+
+        # the cached public profiles expire when their profile, or their user, changes
+        pre_save.connect(remember_profile_slug, sender=self.get_model('Profile'))
+        post_save.connect(profile_changed, sender=self.get_model('Profile'))
+        post_delete.connect(profile_changed, sender=self.get_model('Profile'))
+        post_save.connect(user_changed, sender=settings.AUTH_USER_MODEL)
+        # the index on the emails of the users outlives the migrations rebuilding their table
+        post_migrate.connect(restore_email_index, sender=self)
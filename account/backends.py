@@ -0,0 +1,16 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class ProfileModelBackend(ModelBackend):
+    """The authentication backend of Django, loading the profile of the user in the same query as the user.
+    The AuthenticationMiddleware loads request.user once per request: the middleware, the decorators and
+    the views of the account app all share it (with its profile) rather than looking the user up again."""
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
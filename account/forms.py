@@ -2,10 +2,13 @@ import logging
 
 from django import forms
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm as BaseUserCreationForm
+from django.contrib.auth.forms import PasswordResetForm as BasePasswordResetForm, \
+    UserCreationForm as BaseUserCreationForm
 from django.core.exceptions import ValidationError
+from django.template.loader import render_to_string
 from django.utils.text import slugify
 
+from outbox.models import QueuedMail
 from .models import Profile
 from .utils import ActivationMailFormMixin
 
@@ -94,3 +97,18 @@ class UserCreationForm(ActivationMailFormMixin, BaseUserCreationForm):
     class Meta(BaseUserCreationForm.Meta):
         model = get_user_model()
         fields = ('username', 'email')
+
+
+# The password reset mails go through the outbox as well: the view only renders and queues them
+class PasswordResetForm(BasePasswordResetForm):
+
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email,
+                  html_email_template_name=None):
+        subject = render_to_string(subject_template_name, context)
+        # subject *must not* contain newlines
+        subject = ''.join(subject.splitlines())
+        body = render_to_string(email_template_name, context)
+        html_body = None
+        if html_email_template_name is not None:
+            html_body = render_to_string(html_email_template_name, context)
+        QueuedMail.objects.queue(subject, body, from_email, [to_email], html_message=html_body)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class ProfiledArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2, with its costs taken from the ARGON2_PROFILES setting: ARGON2_PROFILE names the profile
+    in use. The algorithm is still "argon2": the existing hashes are checked as before, and the hashes
+    made with other costs are upgraded the next time their user logs in (see must_update)."""
+
+    @property
+    def profile(self):
+        return settings.ARGON2_PROFILES[settings.ARGON2_PROFILE]
+
+    @property
+    def time_cost(self):
+        return self.profile['time_cost']
+
+    @property
+    def memory_cost(self):
+        return self.profile['memory_cost']
+
+    @property
+    def parallelism(self):
+        return self.profile['parallelism']
@@ -0,0 +1,48 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from account.forms import ResendActivationEmailForm
+from account.utils import MailContextViewMixin
+
+
+class Command(BaseCommand):
+    help = 'Measure the renders/sec of the activation mails: one by one as before, one by one, and in a batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mails', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/', HTTP_HOST='localhost')
+        User = get_user_model()
+        users = [User(pk=n, username='user{}'.format(n), email='user{}@example.org'.format(n), password='!')
+                 for n in range(1, options['mails'] + 1)]
+        kwargs = MailContextViewMixin().get_save_kwargs(request)
+        kwargs.pop('request')
+        form = ResendActivationEmailForm()
+
+        # what every mail cost before: the site lookup, and the two templates resolved and compiled again
+        def uncached():
+            for user in users:
+                context = {'site_name': get_current_site(request).name, 'domain': get_current_site(request).domain,
+                           'protocol': 'http', 'user': user, 'uid': '', 'token': ''}
+                context.update(form.get_user_context(user))
+                ''.join(render_to_string(kwargs['subject_template_name'], context).splitlines())
+                render_to_string(kwargs['email_template_name'], context)
+
+        def one_by_one():
+            for user in users:
+                list(form.render_mails(request, [user], **kwargs))
+
+        def batch():
+            list(form.render_mails(request, users, **kwargs))
+
+        for name, run in (('before', uncached), ('one by one', one_by_one), ('batch', batch)):
+            started = time.perf_counter()
+            run()
+            rate = len(users) / (time.perf_counter() - started)
+            self.stdout.write('{:>10}: {:8.0f} renders/sec'.format(name, rate))
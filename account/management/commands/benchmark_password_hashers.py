@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from account.hashers import ProfiledArgon2PasswordHasher
+
+
+class Command(BaseCommand):
+    help = ('Measure the hashes/sec of every configured password hasher (and of every Argon2 profile) on'
+            ' one core: divide the logins/sec to serve by it to size the login tier.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=2,
+                            help='How long to hash passwords with every hasher.')
+
+    def rate(self, hasher, seconds):
+        salt = hasher.salt()
+        hashes = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            hasher.encode('correct horse battery staple', salt)
+            hashes += 1
+        return hashes / (time.perf_counter() - started)
+
+    def report(self, name, hasher, seconds):
+        try:
+            if hasher.library:
+                hasher._load_library()
+        except ValueError:
+            self.stdout.write('{:<40} not available'.format(name))
+            return
+        self.stdout.write('{:<40} {:10.1f} hashes/sec'.format(name, self.rate(hasher, seconds)))
+
+    def handle(self, *args, **options):
+        for hasher in get_hashers():
+            if isinstance(hasher, ProfiledArgon2PasswordHasher):
+                for profile in sorted(settings.ARGON2_PROFILES):
+                    with override_settings(ARGON2_PROFILE=profile):
+                        self.report('{} ({})'.format(hasher.algorithm, profile), hasher, options['seconds'])
+            else:
+                self.report(hasher.algorithm, hasher, options['seconds'])
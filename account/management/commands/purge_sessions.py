@@ -0,0 +1,16 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+
+from account.sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete the expired sessions from the database, a chunk of rows at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of rows deleted by every query.')
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_sessions(Session, options['chunk_size'])
+        self.stdout.write('Deleted {} expired sessions.'.format(deleted))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from account.utils import BulkActivationMailer
+
+
+class Command(BaseCommand):
+    help = 'Queue a new activation mail for every inactive user (the send_queued_mail command delivers them).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--domain', required=True,
+                            help='The domain of the site, in the activation links (i.e.: www.djangocart.org).')
+        parser.add_argument('--https', action='store_true', help='Use https in the activation links.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of users read, and of mails queued, at once.')
+        parser.add_argument('--rate', type=float, default=getattr(settings, 'ACTIVATION_RESEND_RATE', None),
+                            help='Most mails delivered per second (0: no limit).')
+
+    def progress(self, queued, total):
+        self.stdout.write('Queued {}/{} activation mails.'.format(queued, total))
+
+    def handle(self, *args, **options):
+        site_context = {
+            'domain': options['domain'],
+            'protocol': 'https' if options['https'] else 'http',
+            'site_name': options['domain'],
+        }
+        mailer = BulkActivationMailer(site_context, chunk_size=options['chunk_size'], rate=options['rate'],
+                                      progress=self.progress)
+        # every chunk is committed on its own, so that the worker can deliver the first mails already
+        mailer.send(get_user_model().objects.all())
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+INDEX_NAME = 'account_user_email_idx'
+
+
+# The user model belongs to django.contrib.auth: its table gets the index from here. The users are
+# looked up by email when they ask for their activation mail again
+def create_email_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    schema_editor.execute('CREATE INDEX {} ON {} ({})'.format(
+        schema_editor.quote_name(INDEX_NAME),
+        schema_editor.quote_name(User._meta.db_table),
+        schema_editor.quote_name(User._meta.get_field('email').column)))
+
+
+def drop_email_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX {} ON {}'.format(
+            schema_editor.quote_name(INDEX_NAME), schema_editor.quote_name(User._meta.db_table)))
+    else:
+        schema_editor.execute('DROP INDEX {}'.format(schema_editor.quote_name(INDEX_NAME)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        # SQLite rebuilds a table when altering its columns, losing the indexes Django does not know of:
+        # the index comes after the migrations of the auth.User table (and is put back after any later one,
+        # see account.signals.restore_email_index)
+        ('auth', '0008_alter_user_username_max_length'),
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
@@ -1,6 +1,11 @@
 from django.conf import settings
 from django.db import models
-from django.urls import reverse
+
+from core.urlbuilders import URLBuilder
+
+# see core.urlbuilders
+public_profile_url = URLBuilder('dj-auth:public_profile')
+profile_update_url = URLBuilder('dj-auth:profile_update')
 
 
 # Create your models here.
@@ -12,11 +17,18 @@ class Profile(models.Model):
     slug = models.SlugField(max_length=30, unique=True)
     about = models.TextField(max_length=1000)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        profile = super().from_db(db, field_names, values)
+        # the slug the public profile is cached under (see account.signals)
+        profile._loaded_slug = profile.__dict__.get('slug')
+        return profile
+
     def get_absolute_url(self):
-        return reverse('dj-auth:public_profile', kwargs={'slug': self.slug})
+        return public_profile_url(slug=self.slug)
 
     def get_update_url(self):
-        return reverse('dj-auth:profile_update')
+        return profile_update_url()
 
     def __str__(self):
         return self.user.get_username()
@@ -0,0 +1,102 @@
+"""Session engine (see SESSION_ENGINE) keeping the sessions in the SESSION_CACHE_ALIAS cache, and writing them
+through to the database only when their data changes.
+
+The expiry date of a session moves forward every time it is saved: the database only learns about it when it
+is more than SESSION_DB_REFRESH_INTERVAL seconds ahead of the stored one. The row of an active session may then
+look expired for up to that long: the expired rows are only purged (see purge_expired_sessions) once they are
+older than that.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.exceptions import SuspiciousOperation
+from django.utils import timezone
+from django.utils.encoding import force_text
+
+KEY_PREFIX = 'account.sessions'
+
+# the sessions logged in before the users were loaded with their profile name the stock backend of Django:
+# unless it is still configured, they belong to account.backends.ProfileModelBackend now
+RENAMED_BACKENDS = {'django.contrib.auth.backends.ModelBackend': 'account.backends.ProfileModelBackend'}
+
+
+def _digest(session_data):
+    return hashlib.md5(session_data.encode()).hexdigest()
+
+
+def _refresh_interval():
+    return timedelta(seconds=getattr(settings, 'SESSION_DB_REFRESH_INTERVAL', 3600))
+
+
+def _rename_backend(data):
+    # the session keeps the old name until its data is saved again for another reason
+    backend = data.get(BACKEND_SESSION_KEY)
+    if backend in RENAMED_BACKENDS and backend not in settings.AUTHENTICATION_BACKENDS:
+        data[BACKEND_SESSION_KEY] = RENAMED_BACKENDS[backend]
+    return data
+
+
+def purge_expired_sessions(model, chunk_size=500):
+    """Delete the expired rows chunk_size at a time, each chunk in its own short transaction, so that
+    the purge never holds the database for long. Return the number of rows deleted."""
+    expired = model.objects.filter(expire_date__lt=timezone.now() - _refresh_interval())
+    deleted = 0
+    while True:
+        keys = list(expired.values_list('session_key', flat=True)[:chunk_size])
+        if not keys:
+            return deleted
+        model.objects.filter(session_key__in=keys).delete()
+        deleted += len(keys)
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    # Next to the data of the session, the cache keeps what the database knows about it: the digest of its
+    # encoded data and its expiry date, as the save method needs them
+    _stored = None
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # Some backends (e.g. memcache) raise an exception on invalid cache keys: reset the session
+            entry = None
+        if entry is not None:
+            data, digest, expire_date = entry
+            self._stored = (digest, expire_date)
+            return _rename_backend(data)
+
+        try:
+            s = self.model.objects.get(session_key=self.session_key, expire_date__gt=timezone.now())
+            data = self.decode(s.session_data)
+        except (self.model.DoesNotExist, SuspiciousOperation) as e:
+            if isinstance(e, SuspiciousOperation):
+                logger = logging.getLogger('django.security.%s' % e.__class__.__name__)
+                logger.warning(force_text(e))
+            self._session_key = None
+            return {}
+        self._stored = (_digest(s.session_data), s.expire_date)
+        self._cache.set(self.cache_key, (data,) + self._stored, self.get_expiry_age(expiry=s.expire_date))
+        return _rename_backend(data)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        digest = _digest(self.encode(data))
+        expire_date = self.get_expiry_date()
+        stored = None if must_create else self._stored
+        if stored is None or stored[0] != digest or expire_date - stored[1] > _refresh_interval():
+            DBStore.save(self, must_create)
+            stored = self._stored = (digest, expire_date)
+        self._cache.set(self.cache_key, (data,) + stored, self.get_expiry_age())
+
+    @classmethod
+    def clear_expired(cls):
+        purge_expired_sessions(cls.get_model_class())
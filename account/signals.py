@@ -0,0 +1,56 @@
+# Receivers expiring the cached public profiles (see PublicProfileDetail), and keeping the index on the
+# emails of the users: they are connected to their signals by AccountConfig.ready
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+from .models import Profile
+
+# created by the migration 0002_user_email_index
+EMAIL_INDEX_NAME = 'account_user_email_idx'
+
+
+def public_profile_key(slug):
+    return 'public_profile:{}'.format(slug)
+
+
+def remember_profile_slug(sender, instance, **kwargs):
+    # before an update, find the slug the profile is cached under: the one it was loaded with (see
+    # Profile.from_db), or else the stored one
+    if instance.pk is not None and getattr(instance, '_loaded_slug', None) is None:
+        instance._loaded_slug = sender.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+def profile_changed(sender, instance, **kwargs):
+    # a new slug leaves the profile cached under the old one as well
+    slugs = {instance.slug, getattr(instance, '_loaded_slug', None)} - {None}
+    cache.delete_many([public_profile_key(slug) for slug in slugs])
+    instance._loaded_slug = instance.slug
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # a login only updates the last_login of the user, which the profile page does not show
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    cache.delete_many([public_profile_key(slug) for slug in
+                       Profile.objects.filter(user_id=instance.pk).values_list('slug', flat=True)])
+
+
+def restore_email_index(sender, using, apps=global_apps, **kwargs):
+    """post_migrate receiver. The migrations of django.contrib.auth do not know of the index on the emails
+    of the users (they own the table), and SQLite drops it whenever one of them rebuilds the table: put
+    it back at the end of every migrate (the flush of the test cases sends no apps)."""
+    connection = connections[using]
+    if ('account', '0002_user_email_index') not in MigrationRecorder(connection).applied_migrations():
+        return
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    table = User._meta.db_table
+    with connection.cursor() as cursor:
+        if EMAIL_INDEX_NAME in connection.introspection.get_constraints(cursor, table):
+            return
+        cursor.execute('CREATE INDEX {} ON {} ({})'.format(
+            connection.ops.quote_name(EMAIL_INDEX_NAME),
+            connection.ops.quote_name(table),
+            connection.ops.quote_name(User._meta.get_field('email').column)))
@@ -1 +1,350 @@
-# Create your tests here.
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.hashers import get_hasher, identify_hasher
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.utils.encoding import force_text
+
+from core.ratelimit import CacheBackend, get_backend
+from outbox.models import QueuedMail
+from .forms import ResendActivationEmailForm
+from .models import Profile
+from .sessions import SessionStore
+from .signals import EMAIL_INDEX_NAME, public_profile_key, restore_email_index
+from .utils import BulkActivationMailer, MailContextViewMixin, get_cached_site, get_mail_engine
+
+
+class ActivationMailRenderingTests(TestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/', HTTP_HOST='testserver')
+        self.kwargs = MailContextViewMixin().get_save_kwargs(self.request)
+        del self.kwargs['request']
+        self.form = ResendActivationEmailForm()
+        User = get_user_model()
+        self.users = [User.objects.create_user('user{}'.format(n), 'user{}@example.org'.format(n), 'secret')
+                      for n in range(3)]
+
+    def test_mails_match_the_templates(self):
+        context = self.form.get_context_data(self.request, self.users[0])
+        [(user, mail_kwargs)] = self.form.render_mails(self.request, self.users[:1], **self.kwargs)
+        self.assertEqual(mail_kwargs['message'], render_to_string(self.kwargs['email_template_name'], context))
+        self.assertEqual(mail_kwargs['subject'], 'testserver Account Activation')
+        self.assertEqual(mail_kwargs['recipient_list'], ['user0@example.org'])
+
+    def test_batch_renders_every_user(self):
+        mails = list(self.form.render_mails(self.request, self.users, **self.kwargs))
+        self.assertEqual([user for user, _ in mails], self.users)
+        for user, mail_kwargs in mails:
+            context = self.form.get_user_context(user)
+            self.assertIn('{}/{}/'.format(force_text(context['uid']), context['token']), mail_kwargs['message'])
+
+    def test_templates_are_compiled_once(self):
+        list(self.form.render_mails(self.request, self.users, **self.kwargs))
+        [loader] = get_mail_engine().template_loaders
+        cached = loader.get_template_cache
+        self.assertIn(self.kwargs['email_template_name'], cached)
+        template = cached[self.kwargs['email_template_name']]
+        list(self.form.render_mails(self.request, self.users, **self.kwargs))
+        self.assertIs(loader.get_template_cache[self.kwargs['email_template_name']], template)
+
+    def test_site_is_looked_up_once_per_host(self):
+        self.assertIs(get_cached_site(self.request), get_cached_site(RequestFactory().get('/', HTTP_HOST='testserver')))
+
+
+class BulkActivationMailTests(TestCase):
+    site_context = {'domain': 'www.djangocart.org', 'protocol': 'https', 'site_name': 'Django Cart'}
+
+    def setUp(self):
+        User = get_user_model()
+        for n in range(5):
+            User.objects.create_user('user{}'.format(n), 'user{}@example.org'.format(n), is_active=False)
+        User.objects.create_user('active', 'active@example.org')
+        User.objects.create_user('nomail', '', is_active=False)
+
+    def test_inactive_users_are_mailed_in_chunks(self):
+        progress = []
+        mailer = BulkActivationMailer(self.site_context, chunk_size=2, progress=lambda *args: progress.append(args))
+        # the count, then a select and a bulk insert for every chunk, and the select finding nothing left
+        with self.assertNumQueries(8):
+            self.assertEqual(mailer.send(get_user_model().objects.all()), 5)
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+        recipients = sorted(mail.recipient_list[0] for mail in QueuedMail.objects.all())
+        self.assertEqual(recipients, ['user{}@example.org'.format(n) for n in range(5)])
+        self.assertIn('https://www.djangocart.org/account/activate/', QueuedMail.objects.first().body)
+
+    def test_deliveries_are_spread_by_the_rate(self):
+        BulkActivationMailer(self.site_context, chunk_size=2, rate=2).send(get_user_model().objects.all())
+        attempts = list(QueuedMail.objects.order_by('next_attempt').values_list('next_attempt', flat=True))
+        self.assertEqual((attempts[-1] - attempts[0]).total_seconds(), 2)
+        self.assertEqual(QueuedMail.objects.due().count(), 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('resend_activation_mails', '--domain=www.djangocart.org', chunk_size=3, stdout=out)
+        self.assertEqual(QueuedMail.objects.count(), 5)
+        self.assertIn('Queued 5/5', out.getvalue())
+
+    def test_admin_action(self):
+        get_user_model().objects.create_superuser('admin', 'admin@example.org', 'secret')
+        self.client.login(username='admin', password='secret')
+        users = get_user_model().objects.filter(username__in=['user0', 'user1', 'active'])
+        self.client.post(reverse('admin:auth_user_changelist'), {
+            'action': 'resend_activation_mail',
+            '_selected_action': [user.pk for user in users]})
+        self.assertEqual(sorted(mail.recipient_list[0] for mail in QueuedMail.objects.all()),
+                         ['user0@example.org', 'user1@example.org'])
+
+    def test_email_is_indexed(self):
+        table = get_user_model()._meta.db_table
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        self.assertTrue(any(constraint['index'] and constraint['columns'] == ['email']
+                            for constraint in constraints.values()))
+
+    def test_email_index_is_restored_after_migrating(self):
+        # i.e.: SQLite rebuilt the table for a migration of django.contrib.auth
+        table = get_user_model()._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX {}'.format(connection.ops.quote_name(EMAIL_INDEX_NAME)))
+            restore_email_index(sender=None, apps=global_apps, using=connection.alias)
+            self.assertIn(EMAIL_INDEX_NAME, connection.introspection.get_constraints(cursor, table))
+
+
+@override_settings(ARGON2_PROFILES={'old': {'time_cost': 1, 'memory_cost': 8, 'parallelism': 1},
+                                    'new': {'time_cost': 2, 'memory_cost': 16, 'parallelism': 1}},
+                   ARGON2_PROFILE='old')
+class PasswordHasherTests(TestCase):
+
+    def test_costs_come_from_the_profile(self):
+        encoded = get_hasher().encode('secret', 'somesalt')
+        self.assertIn('$m=8,t=1,p=1$', encoded)
+        with self.settings(ARGON2_PROFILE='new'):
+            self.assertIn('$m=16,t=2,p=1$', get_hasher().encode('secret', 'somesalt'))
+
+    def test_hashes_are_upgraded_at_login(self):
+        user = get_user_model().objects.create_user('user', 'user@example.org', 'secret')
+        self.assertFalse(identify_hasher(user.password).must_update(user.password))
+        with self.settings(ARGON2_PROFILE='new'):
+            self.assertTrue(identify_hasher(user.password).must_update(user.password))
+            self.assertTrue(self.client.login(username='user', password='secret'))
+            user.refresh_from_db()
+            self.assertIn('$m=16,t=2,p=1$', user.password)
+            self.assertFalse(identify_hasher(user.password).must_update(user.password))
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('benchmark_password_hashers', seconds=0.01, stdout=out)
+        self.assertIn('argon2 (new)', out.getvalue())
+        self.assertIn('hashes/sec', out.getvalue())
+
+
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        get_backend().clear()
+        self.addCleanup(get_backend().clear)
+
+    def test_login_is_limited_per_username(self):
+        get_user_model().objects.create_user('user', 'user@example.org', 'secret')
+        url = reverse('dj-auth:login')
+        with mock.patch('django.contrib.auth.forms.authenticate', return_value=None) as authenticate:
+            for n in range(5):
+                self.assertEqual(self.client.post(url, {'username': 'User', 'password': 'wrong'}).status_code, 200)
+            response = self.client.post(url, {'username': 'user', 'password': 'wrong'})
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+            # the password is not even checked
+            self.assertEqual(authenticate.call_count, 5)
+        # other users may still log in, and anybody may see the login page
+        self.assertEqual(self.client.post(url, {'username': 'other', 'password': 'wrong'}).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_resend_activation_is_limited_per_email(self):
+        url = reverse('dj-auth:resend_activation')
+        for n in range(3):
+            self.client.post(url, {'email': 'user@example.org'})
+        self.assertEqual(self.client.post(url, {'email': 'user@example.org'}).status_code, 429)
+        self.assertNotEqual(self.client.post(url, {'email': 'other@example.org'}).status_code, 429)
+
+    def test_contact_is_limited_per_ip(self):
+        url = reverse('contact')
+        data = {'email': 'user@example.org', 'text': 'Hi', 'contact_reason_selector': 'F'}
+        for n in range(5):
+            self.client.post(url, data)
+        self.assertEqual(self.client.post(url, data).status_code, 429)
+        self.assertEqual(QueuedMail.objects.count(), 5)
+        self.assertEqual(self.client.post(url, data, REMOTE_ADDR='10.0.0.1').status_code, 302)
+
+    def test_cache_backend(self):
+        backend = CacheBackend()
+        self.assertEqual(backend.consume('key', 2, 1), 0)
+        self.assertEqual(backend.consume('key', 2, 1), 0)
+        self.assertGreater(backend.consume('key', 2, 1), 0)
+
+
+class SessionStoreTests(TestCase):
+
+    def setUp(self):
+        self.session = SessionStore()
+        self.session['cart'] = [1, 2]
+        self.session.save()
+
+    def reload(self):
+        session = SessionStore(self.session.session_key)
+        session.load()
+        return session
+
+    def test_sessions_are_read_from_the_cache(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.reload()['cart'], [1, 2])
+
+    def test_unchanged_sessions_are_not_written(self):
+        session = self.reload()
+        session['cart'] = [1, 2]
+        with self.assertNumQueries(0):
+            session.save()
+
+    def test_changed_sessions_are_written(self):
+        session = self.reload()
+        session['cart'] = [1, 2, 3]
+        # the update, in its savepoint
+        with self.assertNumQueries(3):
+            session.save()
+        row = Session.objects.get(session_key=session.session_key)
+        self.assertEqual(row.get_decoded()['cart'], [1, 2, 3])
+        # without the cache, the session is read from the database
+        session._cache.clear()
+        self.assertEqual(self.reload()['cart'], [1, 2, 3])
+
+    def test_expiry_date_refreshes_are_batched(self):
+        row = Session.objects.get(session_key=self.session.session_key)
+        with self.settings(SESSION_COOKIE_AGE=settings.SESSION_COOKIE_AGE + 60):
+            session = self.reload()
+            session.modified = True
+            with self.assertNumQueries(0):
+                session.save()
+        with self.settings(SESSION_COOKIE_AGE=settings.SESSION_COOKIE_AGE + 7200):
+            session = self.reload()
+            with self.assertNumQueries(3):
+                session.save()
+        self.assertGreater(Session.objects.get(session_key=session.session_key).expire_date, row.expire_date)
+
+    def test_sessions_of_the_stock_backend_stay_logged_in(self):
+        user = get_user_model().objects.create_user('user', 'user@example.org', 'secret')
+        self.client.force_login(user, backend='django.contrib.auth.backends.ModelBackend')
+        # i.e.: a session logged in before the deploy of ProfileModelBackend
+        session = self.client.session
+        self.assertEqual(session[BACKEND_SESSION_KEY], 'account.backends.ProfileModelBackend')
+        response = self.client.get(reverse('dj-auth:pw_change'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], user)
+
+    def test_purge_deletes_the_expired_rows_in_chunks(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key='expired{}'.format(n), session_data='', expire_date=now - timedelta(days=1))
+             for n in range(5)] +
+            # expired too recently: their sessions may still be alive in the cache
+            [Session(session_key='recent', session_data='', expire_date=now - timedelta(minutes=1))])
+        out = StringIO()
+        call_command('purge_sessions', chunk_size=2, stdout=out)
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+        self.assertEqual(set(Session.objects.values_list('session_key', flat=True)),
+                         {self.session.session_key, 'recent'})
+
+
+class ProfileQueryTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user', 'user@example.org', 'secret')
+        Profile.objects.create(user=self.user, slug='user', about='Hello')
+        self.client.force_login(self.user)
+
+    def test_profile_page_loads_the_user_and_profile_at_once(self):
+        # the session comes from its cache, the user and the profile from a single query
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dj-auth:profile'))
+        self.assertContains(response, 'About user')
+
+    def test_profile_edit_page(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dj-auth:profile_update'))
+        self.assertContains(response, 'Hello')
+        # and the update of the profile
+        with self.assertNumQueries(2):
+            self.client.post(reverse('dj-auth:profile_update'), {'about': 'Bye'})
+        self.assertEqual(Profile.objects.get().about, 'Bye')
+
+    def test_disable_account(self):
+        self.client.get(reverse('dj-auth:disable'))
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(self.user.has_usable_password())
+
+
+class PublicProfileCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user', 'user@example.org', 'secret')
+        Profile.objects.create(user=self.user, slug='user', about='Hello')
+        self.url = reverse('dj-auth:public_profile', kwargs={'slug': 'user'})
+
+    def test_profile_is_read_through_the_cache(self):
+        # the profile and its user in one query, then nothing at all
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(self.url), 'About user')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(self.url), 'Hello')
+
+    def test_only_public_fields_are_cached(self):
+        self.client.get(self.url)
+        cached = cache.get(public_profile_key('user'))
+        self.assertEqual(set(cached), {'id', 'slug', 'about', 'user_id', 'username'})
+        self.assertNotIn(self.user.password, repr(cached))
+
+    def test_profile_update_expires_the_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        self.client.post(reverse('dj-auth:profile_update'), {'about': 'Bye'})
+        self.assertContains(self.client.get(self.url), 'Bye')
+
+    def test_new_slug_expires_the_old_one(self):
+        self.client.get(self.url)
+        profile = Profile.objects.get(slug='user')
+        profile.slug = 'renamed'
+        profile.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        # the same, for a profile which was not loaded from the database
+        self.client.get(profile.get_absolute_url())
+        Profile(pk=profile.pk, user=self.user, slug='user', about='Hello').save()
+        self.assertEqual(self.client.get(profile.get_absolute_url()).status_code, 404)
+
+    def test_disabled_account_expires_the_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        self.client.get(reverse('dj-auth:disable'))
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_login_keeps_the_cache(self):
+        self.client.get(self.url)
+        self.client.login(username='user', password='secret')
+        self.client.logout()
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_missing_profile(self):
+        self.assertEqual(self.client.get(reverse('dj-auth:public_profile', kwargs={'slug': 'nobody'})).status_code,
+                         404)
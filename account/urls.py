@@ -4,6 +4,7 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.core.urlresolvers import reverse_lazy
 from django.views.generic import RedirectView, TemplateView
 
+from .forms import PasswordResetForm
 from .views import ActivateAccount, CreateAccount, DisableAccount, ProfileDetail, ProfileUpdate, PublicProfileDetail, \
     ResendActivationEmail
 
@@ -17,6 +18,7 @@ password_urls = [
     url(r'^reset/$', auth_views.password_reset, {'template_name': 'account/password_reset_form.html',
                                                  'email_template_name': 'account/password_reset_email.txt',
                                                  'subject_template_name': 'account/password_reset_subject.txt',
+                                                 'password_reset_form': PasswordResetForm,
                                                  'post_reset_redirect': reverse_lazy('dj-auth:pw_reset_sent')},
         name='pw_reset_start'),
     url(r'^reset/sent/$', auth_views.password_reset_done, {'template_name': 'account/password_reset_sent.html'},
@@ -1,20 +1,60 @@
 import logging
 import traceback
+from datetime import timedelta
 from logging import CRITICAL, ERROR
-from smtplib import SMTPException
 
 from django.conf import settings
-from django.contrib.auth import get_user
 from django.contrib.auth.tokens import default_token_generator as token_generator
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.exceptions import ValidationError
-from django.core.mail import BadHeaderError, send_mail
-from django.template.loader import render_to_string
+from django.template import Context, Engine
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
+from outbox.models import QueuedMail, mail_error_code
+
 logger = logging.getLogger(__name__)
 
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+
+# The mails are rendered by a template engine of their own: it shares the settings of the default one,
+# but its cached loader compiles every template once per process, even when DEBUG is on (then the
+# default engine compiles the templates of the pages again on every request)
+_mail_engine = None
+
+
+def get_mail_engine():
+    global _mail_engine
+    if _mail_engine is None:
+        engine = Engine.get_default()
+        loaders = engine.loaders
+        if not (len(loaders) == 1 and isinstance(loaders[0], (list, tuple)) and loaders[0][0] == CACHED_LOADER):
+            loaders = [(CACHED_LOADER, loaders)]
+        _mail_engine = Engine(dirs=engine.dirs, loaders=loaders, debug=engine.debug,
+                              libraries=engine.libraries, autoescape=engine.autoescape,
+                              string_if_invalid=engine.string_if_invalid, file_charset=engine.file_charset)
+    return _mail_engine
+
+
+def render_mail_template(template_name, context):
+    # context is a dictionary, or a Context to share between the renders of the subject and of the body
+    engine = get_mail_engine()
+    if not isinstance(context, Context):
+        context = Context(context, autoescape=engine.autoescape)
+    return engine.get_template(template_name).render(context)
+
+
+# the site of every host is looked up once per process (like the sites framework caches its Site objects)
+_sites = {}
+
+
+def get_cached_site(request):
+    host = request.get_host()
+    if host not in _sites:
+        _sites[host] = get_current_site(request)
+    return _sites[host]
+
 
 class ActivationMailFormMixin:
     mail_validation_error = ''
@@ -58,80 +98,93 @@ class ActivationMailFormMixin:
     def get_message(self, **kwargs):
         email_template_name = kwargs.get('email_template_name')
         context = kwargs.get('context')
-        return render_to_string(email_template_name, context)
+        return render_mail_template(email_template_name, context)
 
     # get the mail subject of the message sent to the user
     def get_subject(self, **kwargs):
         subject_template_name = kwargs.get('subject_template_name')
         context = kwargs.get('context')
-        subject = render_to_string(subject_template_name, context)
+        subject = render_mail_template(subject_template_name, context)
         # subject *must not* contain newlines
         subject = ''.join(subject.splitlines())
         return subject
 
-    # if context is null, let's create a new one filled with the relevant keys/values for the activation
-    def get_context_data(self, request, user, context=None):
-        if context is None:
-            context = dict()
-        # get the current site, and check if user is connecting through  http or https
-        current_site = get_current_site(request)
+    # the part of the context which is the same for all the users: the current site, and whether the user
+    # is connecting through http or https
+    def get_site_context(self, request):
+        current_site = get_cached_site(request)
         if request.is_secure():
             protocol = 'https'
         else:
             protocol = 'http'
-        # then, let's create a cryptographic token to be used with the authentication url
-        token = token_generator.make_token(user)
-        # turn into bytes and encode the 'user' primary key in base64, to be included in the url
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        # finally, we assemble the 'context' dictionary and return it to the caller
-        context.update({
+        return {
             'domain': current_site.domain,
             'protocol': protocol,
             'site_name': current_site.name,
-            'token': token,
-            'uid': uid,
+        }
+
+    # the part of the context which is specific to the user: a cryptographic token to be used with the
+    # authentication url, and the user primary key turned into bytes and encoded in base64, to be included
+    # in the url as well
+    def get_user_context(self, user):
+        return {
+            'token': token_generator.make_token(user),
+            'uid': urlsafe_base64_encode(force_bytes(user.pk)),
             'user': user,
-        })
+        }
+
+    # if context is null, let's create a new one filled with the relevant keys/values for the activation
+    def get_context_data(self, request, user, context=None):
+        if context is None:
+            context = dict()
+        context.update(self.get_site_context(request))
+        context.update(self.get_user_context(user))
         return context
 
-    # define an "utility" function that will handle the main job of sending the activation email to the user,
-    # given a proper HttpRequest AND a user passed to the function.
-    # Notice that the contexts contents, the mail message and the mail subject will be retrieved by
-    # the three methods we defined up here
-    def _send_mail(self, request, user, **kwargs):
-        kwargs['context'] = self.get_context_data(request, user)
-        mail_kwargs = {
+    # the arguments of the queue method, for the mail to the user. The subject and the message are
+    # rendered from the same context
+    def get_mail_kwargs(self, user, **kwargs):
+        return {
             "subject": self.get_subject(**kwargs),
             "message": self.get_message(**kwargs),
             "from_email": settings.DEFAULT_FROM_EMAIL,
             "recipient_list": [user.email],
         }
+
+    # render the mails of many users at once (i.e.: for a bulk resend of the activation mails), yielding every
+    # user with its mail_kwargs: the site part of the context is computed once, the user part is pushed on
+    # top of it for every user
+    def render_mails(self, request, users, **kwargs):
+        return self.render_site_mails(self.get_site_context(request), users, **kwargs)
+
+    def render_site_mails(self, site_context, users, **kwargs):
+        context = Context(site_context, autoescape=get_mail_engine().autoescape)
+        kwargs['context'] = context
+        for user in users:
+            with context.push(self.get_user_context(user)):
+                yield user, self.get_mail_kwargs(user, **kwargs)
+
+    # define an "utility" function that will handle the main job of sending the activation email to the user,
+    # given a proper HttpRequest AND a user passed to the function.
+    # Notice that the contexts contents, the mail message and the mail subject will be retrieved by
+    # the methods we defined up here
+    def _send_mail(self, request, user, **kwargs):
+        kwargs['context'] = Context(self.get_context_data(request, user), autoescape=get_mail_engine().autoescape)
+        mail_kwargs = self.get_mail_kwargs(user, **kwargs)
         try:
-            # number_sent value will be 0 or 1. Notice what happens here: the send_mail
-            # method is from the django.mail package and it has NOTHING to do with the
-            # send_mail methods we define in this class. Also, notice how the mail_kwargs
-            # dictionary is expanded to cover all the arguments expected by the function
-            number_sent = send_mail(**mail_kwargs)
+            # the mail is not sent here, but queued in the outbox: the send_queued_mail command delivers
+            # it, so that a slow mail server never holds up the request. Notice how the mail_kwargs
+            # dictionary is expanded to cover all the arguments expected by the queue method.
+            # A bad header is refused right away, as send_mail would do
+            self.queued_mail = QueuedMail.objects.queue(**mail_kwargs)
         except Exception as error:
             self.log_mail_error(error=error, **mail_kwargs)
-            if isinstance(error, BadHeaderError):
-                err_code = 'badheader'
-            elif isinstance(error, SMTPException):
-                err_code = 'smtperror'
-            else:
-                err_code = 'unexpectederror'
-            return (False, err_code)
-        else:
-            # else, if the activation email has actually been sent
-            if number_sent > 0:
-                return (True, None)
-        # in any other case, we are facing and unknown error and we must log it
-        self.log_mail_error(**mail_kwargs)
-        return (False, 'unknownerror')
+            return (False, mail_error_code(error))
+        return (True, None)
 
     # This is the actual send_mail method that we will call from the UserRegistrationForm. The flow of
     # the complete actions is then: send_mail from the UserCreationForm, which call the _send_mail ("static") method
-    # of this class, which in turn call the send_mail method of the django.mail package..
+    # of this class, which in turn queues the mail in the outbox..
     def send_mail(self, user, **kwargs):
         # Extract the http request dictionary element from the UserCreationForm, or assign it the value None
         # in case request is empty (In this case, an empty dictionary will trigger some error
@@ -167,11 +220,63 @@ class MailContextViewMixin:
         }
 
 
+# Stream a queryset in chunks of chunk_size objects, walking the primary key: every chunk is a query
+# using the primary key index, however far into the table it is
+def iter_chunks(queryset, chunk_size):
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+class BulkActivationMailer(MailContextViewMixin, ActivationMailFormMixin):
+    """Queue the activation mails of many inactive users at once (i.e.: after an outage of the mail server).
+
+    The users are read and their mails rendered and queued chunk_size at a time. The mails are spread
+    in time so that the outbox worker delivers at most rate of them per second (not limited when rate
+    is None). progress, when given, is called after every chunk with the number of mails queued so far
+    and the number of users to mail."""
+
+    def __init__(self, site_context, chunk_size=500, rate=None, progress=None):
+        self.site_context = site_context
+        self.chunk_size = chunk_size
+        self.rate = rate
+        self.progress = progress
+
+    def send(self, users):
+        users = users.filter(is_active=False).exclude(email='')
+        total = users.count()
+        kwargs = {
+            'email_template_name': self.email_template_name,
+            'subject_template_name': self.subject_template_name,
+        }
+        start = timezone.now()
+        queued = 0
+        for chunk in iter_chunks(users, self.chunk_size):
+            mails = []
+            for user, mail_kwargs in self.render_site_mails(self.site_context, chunk, **kwargs):
+                next_attempt = start
+                if self.rate:
+                    next_attempt += timedelta(seconds=(queued + len(mails)) / self.rate)
+                mails.append(QueuedMail.objects.build(next_attempt=next_attempt, **mail_kwargs))
+            QueuedMail.objects.bulk_create(mails)
+            queued += len(mails)
+            if self.progress is not None:
+                self.progress(queued, total)
+        return queued
+
+
 # To display the profile of the current user, we retrieve the authenticated User from the HttpRequest object
 # and return the associated user Profile. Note the use of the "get_object()" as name of the method
 # This naming convention is commonly used in the GCBV generic classes, and we will actually
 # overwrite the get_object() method of the UpdateView GCBV class inherited by the ProfileUpdate view...
 class ProfileGetObjectMixin:
     def get_object(self):
-        current_user = get_user(self.request)
+        # request.user comes with its profile (see account.backends)
+        current_user = self.request.user
         return current_user.profile
@@ -1,8 +1,9 @@
 from django.conf import settings
-from django.contrib.auth import get_user, get_user_model, logout
+from django.contrib.auth import get_user_model, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.tokens import default_token_generator as token_generator
 from django.contrib.messages import error, success
+from django.core.cache import cache
 from django.core.urlresolvers import reverse_lazy
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
@@ -14,12 +15,14 @@ from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.debug import sensitive_post_parameters
 from django.views.generic import DetailView, View
 
+from core.ratelimit import ratelimit
 # we import an artifact UpdateView from the "core" app, because the names of our update forms
 # do not conform with the common "template_suffix_name" of the django GCBV views
 from core.utils import UpdateView
 from .decorators import class_login_required
 from .forms import ResendActivationEmailForm, UserCreationForm
 from .models import Profile
+from .signals import public_profile_key
 from .utils import MailContextViewMixin, ProfileGetObjectMixin
 
 
@@ -60,6 +63,9 @@ class ActivateAccount(View):
             return TemplateResponse(request, self.template_name)
 
 
+# the rate of the account creations and of the activation mails is limited, to keep the bots from burning
+# the CPU (hashing the passwords) and the mail server
+@ratelimit(('ip', '10/h'))
 class CreateAccount(MailContextViewMixin, View):
     # we use our customized UserCreationForm as form_class
     form_class = UserCreationForm
@@ -102,7 +108,7 @@ class DisableAccount(View):
     @method_decorator(login_required)
     @method_decorator(csrf_protect)
     def get(self, request):
-        disabled_user = get_user(request)
+        disabled_user = request.user
         disabled_user.set_unusable_password()
         disabled_user.is_active = False
         disabled_user.save()
@@ -122,6 +128,26 @@ class ProfileDetail(ProfileGetObjectMixin, DetailView):
 # on the other hand, a read only version of the profile is available to anybody
 class PublicProfileDetail(DetailView):
     model = Profile
+    # the profile comes with its user in a single query, and from the cache when it is there: it expires
+    # when the profile or its user change (see account.signals). Only the fields the page shows are cached,
+    # never the user (its password hash, email...)
+    queryset = Profile.objects.select_related('user')
+
+    def get_object(self, queryset=None):
+        key = public_profile_key(self.kwargs.get(self.slug_url_kwarg))
+        fields = cache.get(key)
+        if fields is None:
+            profile = super().get_object(queryset)
+            fields = {'id': profile.pk, 'slug': profile.slug, 'about': profile.about,
+                      'user_id': profile.user_id, 'username': profile.user.get_username()}
+            cache.set(key, fields, getattr(settings, 'PUBLIC_PROFILE_CACHE_TIMEOUT', 3600))
+            return profile
+        fields = dict(fields)
+        User = get_user_model()
+        user = User(pk=fields['user_id'], **{User.USERNAME_FIELD: fields.pop('username')})
+        profile = Profile(**fields)
+        profile.user = user
+        return profile
 
 
 @class_login_required
@@ -130,6 +156,7 @@ class ProfileUpdate(ProfileGetObjectMixin, UpdateView):
     model = Profile
 
 
+@ratelimit(('ip', '10/h'), ('post:email', '3/h'))
 class ResendActivationEmail(MailContextViewMixin, View):
     form_class = ResendActivationEmailForm
     success_url = reverse_lazy('dj-auth:login')
@@ -1,5 +1,33 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 
 
 class BlogConfig(AppConfig):
     name = 'blog'
+
+    def ready(self):
+        from core.cache import bump_m2m_versions, bump_model_version
+        from product.facets import index_tagged, unindex_tagged
+        from product.signals import count_tagged, uncount_tagged
+        from .signals import (archive_deleted_post, archive_saved_post, post_changed, post_relations_changed,
+                              remember_publication_date)
+
+        post = self.get_model('Post')
+        # see ProductConfig.ready
+        post_save.connect(bump_model_version, sender=post)
+        post_delete.connect(bump_model_version, sender=post)
+        for signal in (post_save, pre_delete, post_delete):
+            signal.connect(post_changed, sender=post)
+        m2m_changed.connect(bump_m2m_versions, sender=post.products.through)
+        m2m_changed.connect(bump_m2m_versions, sender=post.tags.through)
+        m2m_changed.connect(post_relations_changed, sender=post.products.through)
+        m2m_changed.connect(post_relations_changed, sender=post.tags.through)
+        # see ProductConfig.ready
+        m2m_changed.connect(count_tagged, sender=post.tags.through)
+        pre_delete.connect(uncount_tagged, sender=post)
+        m2m_changed.connect(index_tagged, sender=post.tags.through)
+        post_delete.connect(unindex_tagged, sender=post)
+        # keep the archive summary up to date
+        pre_save.connect(remember_publication_date, sender=post)
+        post_save.connect(archive_saved_post, sender=post)
+        post_delete.connect(archive_deleted_post, sender=post)
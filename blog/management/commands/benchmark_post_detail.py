@@ -0,0 +1,68 @@
+import logging
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from blog.models import Post
+from blog.views import post_detail
+
+
+class Command(BaseCommand):
+    help = 'Time the blog post detail page (and the lookup it replaced) as the number of posts grows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000,500000',
+                            help='Comma-separated numbers of posts to measure at.')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Number of requests timed at every size.')
+
+    def handle(self, *args, **options):
+        # the DEBUG "django" logger would spend more time printing the queries than running them
+        logging.disable(logging.CRITICAL)
+        # everything happens in a throwaway test database: the real one is never touched
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seeded = 0
+            for size in sorted(int(size) for size in options['sizes'].split(',')):
+                self.seed(seeded, size)
+                seeded = size
+                self.measure(size, options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, start, stop, batch_size=10000):
+        first_day = date(2000, 1, 1)
+        for batch_start in range(start, stop, batch_size):
+            Post.objects.bulk_create(
+                Post(title='post {}'.format(i), slug='post-{}'.format(i), text='text',
+                     publication_date=first_day + timedelta(days=i % 6000))
+                for i in range(batch_start, min(batch_start + batch_size, stop)))
+
+    def measure(self, size, how_many):
+        posts = list(Post.objects.order_by('?').values_list('slug', 'publication_date')[:how_many])
+        factory = RequestFactory()
+
+        def detail_page(slug, day):
+            request = factory.get('/')
+            request.user = AnonymousUser()
+            post_detail(request, str(day.year), str(day.month), slug)
+
+        # the lookup the views used to run
+        def function_lookup(slug, day):
+            Post.objects.get(publication_date__year=day.year, publication_date__month=day.month,
+                             slug__iexact=slug)
+
+        timings = []
+        for fetch in (detail_page, function_lookup):
+            random.shuffle(posts)
+            start = time.perf_counter()
+            for slug, day in posts:
+                fetch(slug, day)
+            timings.append((time.perf_counter() - start) / len(posts) * 1000)
+        self.stdout.write('{:>8} posts   detail page: {:7.3f} ms   __year/__month/__iexact lookup: {:7.3f} ms'.format(
+            size, *timings))
@@ -0,0 +1,95 @@
+import logging
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from blog.models import Post
+from blog.views import PostList
+from product.models import Product, Tag
+
+
+# the URL methods of the posts as they were: a full reverse() for every call
+def reversed_urls():
+    def method(name):
+        return lambda post: reverse(name, kwargs=post.get_url_kwargs())
+
+    return mock.patch.multiple(Post,
+                               get_absolute_url=method('blog_post_detail'),
+                               get_update_url=method('blog_post_update'),
+                               get_delete_url=method('blog_post_delete'))
+
+
+class Command(BaseCommand):
+    help = 'Count the queries and time the rendering of a page of blog posts, with and without ' \
+           'the prefetched relations and the precompiled URLs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50,
+                            help='Number of posts on the page.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Number of renders timed for every variant.')
+
+    def handle(self, *args, **options):
+        # the DEBUG "django" logger would spend more time printing the queries than running them
+        logging.disable(logging.CRITICAL)
+        # everything happens in a throwaway test database: the real one is never touched
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed(options['posts'])
+            self.run(options['posts'], options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, posts):
+        tags = [Tag.objects.create(name='tag {}'.format(i), slug='tag-{}'.format(i)) for i in range(10)]
+        products = [Product.objects.create(name='product {}'.format(i), slug='product-{}'.format(i))
+                    for i in range(10)]
+        for i in range(posts):
+            post = Post.objects.create(title='post {}'.format(i), slug='post-{}'.format(i), text='text')
+            post.tags.add(*tags[i % 10:i % 10 + 3])
+            post.products.add(*products[i % 10:i % 10 + 2])
+
+    def render(self, view):
+        request = RequestFactory().get('/blog/')
+        request.user = AnonymousUser()
+        # the page cache would answer everything but the first request
+        cache.clear()
+        view(request).render()
+
+    def run(self, posts, how_many):
+        variants = (
+            ('before', (), True),
+            ('prefetch', ('products', 'tags'), True),
+            ('prefetch + URL builders', ('products', 'tags'), False),
+        )
+        for name, prefetch, use_reverse in variants:
+            view = PostList.as_view(paginate_by=posts, prefetch=prefetch)
+            with reversed_urls() if use_reverse else ExitStack():
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.render(view)
+                start = time.perf_counter()
+                for _ in range(how_many):
+                    self.render(view)
+                elapsed = (time.perf_counter() - start) / how_many * 1000
+            self.stdout.write('{:<24} {:4} queries   {:8.2f} ms'.format(name, len(queries), elapsed))
+
+        post_list = list(Post.objects.all()[:posts])
+        for name, patch in (('reverse()', reversed_urls()), ('URL builders', ExitStack())):
+            with patch:
+                start = time.perf_counter()
+                for _ in range(how_many):
+                    for post in post_list:
+                        post.get_absolute_url()
+                        post.get_update_url()
+                        post.get_delete_url()
+                elapsed = (time.perf_counter() - start) / how_many / len(post_list) / 3 * 1000000
+            self.stdout.write('{:<24} {:8.2f} us per URL'.format(name, elapsed))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 18:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def build_archive(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostArchive = apps.get_model('blog', 'PostArchive')
+    months = (Post.objects
+              .annotate(year=ExtractYear('publication_date'), month=ExtractMonth('publication_date'))
+              .values('year', 'month')
+              .annotate(post_count=Count('id'))
+              .order_by())
+    PostArchive.objects.bulk_create(PostArchive(**month) for month in months)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('post_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-year', '-month'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='postarchive',
+            unique_together=set([('year', 'month')]),
+        ),
+        migrations.RunPython(build_archive, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 18:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def lowercase_slugs(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.update(slug=Lower('slug'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_post_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['slug', 'publication_date'], name='blog_post_slug_1c370f_idx'),
+        ),
+        migrations.RunPython(lowercase_slugs, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,16 @@
-from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import ExtractMonth, ExtractYear
 
+from core.urlbuilders import URLBuilder
 from product.models import Product, Tag
 
+post_detail_url = URLBuilder('blog_post_detail')
+post_update_url = URLBuilder('blog_post_update')
+post_delete_url = URLBuilder('blog_post_delete')
+archive_year_url = URLBuilder('blog_post_archive_year')
+archive_month_url = URLBuilder('blog_post_archive_month')
+
 
 class Post(models.Model):
     title = models.CharField(max_length=63)
@@ -14,34 +22,85 @@ class Post(models.Model):
     products = models.ManyToManyField(Product)
     tags = models.ManyToManyField(Tag)
 
+    # the URLs of a post are built for every row of the list pages: see core.urlbuilders
+    def get_url_kwargs(self):
+        return {'year': self.publication_date.year,
+                'month': self.publication_date.month,
+                'slug': self.slug}
+
     # get reversed url for links to the "details" page
     def get_absolute_url(self):
-        return reverse('blog_post_detail', kwargs={'year': self.publication_date.year,
-                                                   'month': self.publication_date.month,
-                                                   'slug': self.slug})
+        return post_detail_url(**self.get_url_kwargs())
 
     # get reversed url for links to the "update" page
     def get_update_url(self):
-        return reverse('blog_post_update', kwargs={'year': self.publication_date.year,
-                                                   'month': self.publication_date.month,
-                                                   'slug': self.slug})
+        return post_update_url(**self.get_url_kwargs())
 
     def get_delete_url(self):
-        return reverse('blog_post_delete', kwargs={'year': self.publication_date.year,
-                                                   'month': self.publication_date.month,
-                                                   'slug': self.slug})
+        return post_delete_url(**self.get_url_kwargs())
 
     def get_archive_year_month(self):
-        return reverse('blog_post_archive_year', kwargs={'year': self.publication_date.year,
-                                                         'month': self.publication_date.month})
+        return archive_month_url(year=self.publication_date.year, month=self.publication_date.month)
 
     def get_archive_year_url(self):
-        return reverse('blog_post_archive_year', kwargs={'year': self.publication_date.year})
+        return archive_year_url(year=self.publication_date.year)
 
     def __str__(self):
         return '{} published on {}'.format(self.title, self.publication_date.strftime('%d-%m-%Y'))
 
+    # slugs are always stored lowercase, so that they can be looked up with a plain (indexed) equality
+    def save(self, *args, **kwargs):
+        self.slug = self.slug.lower()
+        super().save(*args, **kwargs)
+
     class Meta:
         # order blog posts from oldest to newest AND title
         ordering = ['-publication_date', 'title']
         get_latest_by = 'publication_date'
+        # backs the slug + publication month lookup of the detail, update and delete views
+        indexes = [models.Index(fields=['slug', 'publication_date'])]
+
+
+class PostArchiveManager(models.Manager):
+
+    # add delta (1 or -1) to the posts published in the month of the given date
+    def record(self, date, delta):
+        month = self.filter(year=date.year, month=date.month)
+        if month.update(post_count=F('post_count') + delta):
+            if delta < 0:
+                month.filter(post_count__lte=0).delete()
+        elif delta > 0:
+            try:
+                with transaction.atomic():
+                    self.create(year=date.year, month=date.month, post_count=delta)
+            except IntegrityError:
+                # somebody else created the month in the meantime
+                month.update(post_count=F('post_count') + delta)
+
+    # recompute the whole summary from the posts table (i.e.: after a bulk_create, which sends no signal)
+    def rebuild(self):
+        months = (Post.objects
+                  .annotate(year=ExtractYear('publication_date'), month=ExtractMonth('publication_date'))
+                  .values('year', 'month')
+                  .annotate(post_count=Count('id'))
+                  .order_by())
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(self.model(**month) for month in months)
+
+
+class PostArchive(models.Model):
+    """Number of posts published in every month: the blog archive views read their year and
+    month lists from here instead of aggregating the posts table. See blog.signals."""
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    post_count = models.PositiveIntegerField(default=0)
+
+    objects = PostArchiveManager()
+
+    def __str__(self):
+        return '{}-{:02}: {} posts'.format(self.year, self.month, self.post_count)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        unique_together = ('year', 'month')
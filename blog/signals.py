@@ -0,0 +1,43 @@
+# Receivers keeping the PostArchive summary in step with the posts table, and bumping the
+# versions of the cached pages (see product.signals): they are connected to the Post signals by
+# BlogConfig.ready
+from core.cache import bump_model_version, bump_object_versions
+from .models import Post, PostArchive
+
+
+def remember_publication_date(sender, instance, **kwargs):
+    # before an update, look up the date the post is currently archived under
+    instance._archived_date = None
+    if instance.pk is not None:
+        instance._archived_date = (sender.objects
+                                   .filter(pk=instance.pk)
+                                   .values_list('publication_date', flat=True)
+                                   .first())
+
+
+def archive_saved_post(sender, instance, created, **kwargs):
+    old_date = getattr(instance, '_archived_date', None)
+    new_date = instance.publication_date
+    if created or old_date is None:
+        PostArchive.objects.record(new_date, 1)
+    elif (old_date.year, old_date.month) != (new_date.year, new_date.month):
+        PostArchive.objects.record(old_date, -1)
+        PostArchive.objects.record(new_date, 1)
+
+
+def archive_deleted_post(sender, instance, **kwargs):
+    PostArchive.objects.record(instance.publication_date, -1)
+
+
+def post_changed(sender, instance, **kwargs):
+    bump_object_versions(sender, [instance.pk])
+    if kwargs.get('created'):
+        return
+    bump_object_versions(instance.products.model, instance.products.values_list('pk', flat=True))
+    bump_object_versions(instance.tags.model, instance.tags.values_list('pk', flat=True))
+
+
+def post_relations_changed(sender, action, **kwargs):
+    # the list pages show the products and the tags of the posts (see PostList)
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_model_version(Post)
@@ -1 +1,143 @@
-# Create your tests here.
+from datetime import date
+
+from django.core.cache import cache
+from django.core.urlresolvers import NoReverseMatch, reverse, set_script_prefix
+from django.test import TestCase, override_settings
+
+from core.urlbuilders import URLBuilder
+from product.models import Product, Tag
+from .models import Post, PostArchive
+
+
+class PostArchiveTests(TestCase):
+
+    def create_post(self, slug, publication_date):
+        post = Post.objects.create(title=slug, slug=slug, text='text')
+        # publication_date is set on creation: move the post back in time
+        post.publication_date = publication_date
+        post.save()
+        return post
+
+    def assertArchive(self, expected):
+        self.assertEqual(
+            list(PostArchive.objects.values_list('year', 'month', 'post_count')), expected)
+
+    def test_archive_follows_the_posts(self):
+        first = self.create_post('first', date(2016, 3, 10))
+        self.create_post('second', date(2016, 3, 20))
+        self.create_post('third', date(2015, 12, 1))
+        self.assertArchive([(2016, 3, 2), (2015, 12, 1)])
+        first.publication_date = date(2016, 4, 1)
+        first.save()
+        self.assertArchive([(2016, 4, 1), (2016, 3, 1), (2015, 12, 1)])
+        first.delete()
+        self.assertArchive([(2016, 3, 1), (2015, 12, 1)])
+        PostArchive.objects.rebuild()
+        self.assertArchive([(2016, 3, 1), (2015, 12, 1)])
+
+    def test_archive_views_read_the_summary(self):
+        self.create_post('first', date(2016, 3, 10))
+        self.create_post('second', date(2016, 5, 20))
+        self.create_post('third', date(2014, 12, 1))
+        response = self.client.get('/blog/')
+        self.assertEqual(list(response.context['date_list']), [date(2016, 1, 1), date(2014, 1, 1)])
+        response = self.client.get('/blog/2016/')
+        self.assertEqual(list(response.context['date_list']), [date(2016, 3, 1), date(2016, 5, 1)])
+        self.assertEqual(response.context['previous_year'], date(2014, 1, 1))
+        self.assertIsNone(response.context['next_year'])
+        response = self.client.get('/blog/2016/03/')
+        self.assertEqual(response.context['next_month'], date(2016, 5, 1))
+        self.assertEqual(response.context['previous_month'], date(2014, 12, 1))
+
+
+class PostLookupTests(TestCase):
+
+    def setUp(self):
+        self.post = Post.objects.create(title='Title', slug='Mixed-Case', text='text')
+
+    def test_slug_is_stored_lowercase(self):
+        self.assertEqual(Post.objects.get(pk=self.post.pk).slug, 'mixed-case')
+
+    def test_detail_lookup(self):
+        today = self.post.publication_date
+        url = '/blog/{}/{}/{}/'
+        self.assertEqual(self.client.get(url.format(today.year, today.month, 'MIXED-case')).status_code, 200)
+        self.assertEqual(self.client.get(url.format(today.year, today.month % 12 + 1, 'mixed-case')).status_code, 404)
+        self.assertEqual(self.client.get(url.format(today.year, 13, 'mixed-case')).status_code, 404)
+
+    def test_last_month_of_the_calendar(self):
+        url = '/blog/9999/12/mixed-case/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url + 'update/').status_code, 404)
+
+
+class URLBuilderTests(TestCase):
+
+    def test_same_urls_as_reverse(self):
+        post = Post.objects.create(title='Title', slug='a-post', text='text')
+        kwargs = post.get_url_kwargs()
+        self.assertEqual(post.get_absolute_url(), reverse('blog_post_detail', kwargs=kwargs))
+        self.assertEqual(post.get_update_url(), reverse('blog_post_update', kwargs=kwargs))
+        self.assertEqual(post.get_delete_url(), reverse('blog_post_delete', kwargs=kwargs))
+        # namespaced names, and names without arguments
+        self.assertEqual(URLBuilder('dj-auth:pw_reset_confirm')(uidb64='MQ', token='a-b'),
+                         reverse('dj-auth:pw_reset_confirm', kwargs={'uidb64': 'MQ', 'token': 'a-b'}))
+        self.assertEqual(URLBuilder('blog_post_list')(), reverse('blog_post_list'))
+        profile_url = URLBuilder('dj-auth:public_profile')
+        self.assertEqual(profile_url(slug='someone'), reverse('dj-auth:public_profile', kwargs={'slug': 'someone'}))
+        set_script_prefix('/store/')
+        self.addCleanup(set_script_prefix, '/')
+        self.assertEqual(profile_url(slug='someone'), '/store/account/someone/')
+
+    def test_wrong_arguments(self):
+        with self.assertRaises(NoReverseMatch):
+            URLBuilder('blog_post_detail')(year=2017)
+        with self.assertRaises(NoReverseMatch):
+            URLBuilder('missing:blog_post_detail')(year=2017, month=5, slug='a-post')
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=None)
+class PostListQueryTests(TestCase):
+
+    def add_posts(self, how_many):
+        offset = Post.objects.count()
+        for i in range(offset, offset + how_many):
+            post = Post.objects.create(title='post {}'.format(i), slug='post-{}'.format(i), text='text')
+            post.tags.add(Tag.objects.create(name='tag {}'.format(i), slug='tag-{}'.format(i)))
+            post.products.add(Product.objects.create(name='product {}'.format(i), slug='product-{}'.format(i)))
+
+    def test_query_count_is_constant(self):
+        today = date.today()
+        # on top of the lists of dates and the counts: the page of posts, and one query
+        # for each of their relations
+        pages = (('/blog/', 6),
+                 ('/blog/{}/'.format(today.year), 8),
+                 ('/blog/{}/{:02}/'.format(today.year, today.month), 8))
+        for how_many in (1, 4):
+            self.add_posts(how_many)
+            for url, queries in pages:
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertContains(response, 'Tag 0')
+
+
+class PostListCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(title='Title', slug='title', text='text')
+        self.tag = Tag.objects.create(name='tools', slug='tools')
+        self.post.tags.add(self.tag)
+
+    def test_page_follows_the_relations_of_the_posts(self):
+        response = self.client.get('/blog/')
+        self.assertContains(response, 'Tools')
+        self.tag.name = 'gadgets'
+        self.tag.save()
+        renamed = self.client.get('/blog/')
+        self.assertContains(renamed, 'Gadgets')
+        self.assertNotEqual(renamed['ETag'], response['ETag'])
+        self.post.products.add(Product.objects.create(name='widget', slug='widget'))
+        self.assertContains(self.client.get('/blog/'), 'widget</a>')
+        self.tag.post_set.clear()
+        self.assertNotContains(self.client.get('/blog/'), 'Gadgets')
@@ -0,0 +1,107 @@
+from datetime import date
+
+from django.db.models import Q
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from .models import Post, PostArchive
+
+
+# first day of the month, and first day of the following one
+def month_bounds(year, month):
+    try:
+        start = date(int(year), int(month), 1)
+        # December 9999 has no following month either
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    except ValueError:
+        raise Http404('Invalid date.')
+    return start, end
+
+
+# Look a post up by the year and month of publication and its slug. The month is expressed as a
+# range of dates, not with __year/__month (they wrap the column in a function, and no index could
+# be used), and slugs are stored lowercase (see Post.save), so no __iexact is needed either
+def get_post_or_404(year, month, slug):
+    start, end = month_bounds(year, month)
+    return get_object_or_404(Post,
+                             slug=slug.lower(),
+                             publication_date__gte=start,
+                             publication_date__lt=end)
+
+
+class ArchiveSummaryMixin:
+    """ This mixin extends the date-based GCBVs of the blog: the lists of years and months, and the
+    links to the previous and next periods, are read from the small PostArchive summary, instead of
+    truncating the publication date of every row of the posts table.
+    Day lists are not summarized, and still come from the queryset."""
+
+    def get_archive(self):
+        archive = PostArchive.objects.all()
+        if not self.get_allow_future():
+            today = timezone.localdate()
+            archive = archive.filter(Q(year__lt=today.year) | Q(year=today.year, month__lte=today.month))
+        return archive
+
+    def get_date_list(self, queryset, date_type=None, ordering='ASC'):
+        if date_type is None:
+            date_type = self.get_date_list_period()
+        if date_type == 'year':
+            years = self.get_archive().order_by('year').values_list('year', flat=True).distinct()
+            date_list = [date(year, 1, 1) for year in years]
+        elif date_type == 'month':
+            year = int(self.get_year())
+            months = self.get_archive().filter(year=year).order_by('month').values_list('month', flat=True)
+            date_list = [date(year, month, 1) for month in months]
+        else:
+            return super().get_date_list(queryset, date_type, ordering)
+        if ordering == 'DESC':
+            date_list.reverse()
+        if not date_list and not self.get_allow_empty():
+            raise Http404('No {} available'.format(queryset.model._meta.verbose_name_plural))
+        return date_list
+
+    def _adjacent_month(self, year, month, following):
+        if following:
+            condition = Q(year__gt=year) | Q(year=year, month__gt=month)
+            ordering = ('year', 'month')
+        else:
+            condition = Q(year__lt=year) | Q(year=year, month__lt=month)
+            ordering = ('-year', '-month')
+        return self.get_archive().filter(condition).order_by(*ordering).values_list('year', 'month').first()
+
+    # with allow_empty set, the GCBVs just link the adjacent periods: only the search for the
+    # closest period having some posts is worth serving from the summary
+    def get_next_year(self, date_):
+        if self.get_allow_empty():
+            return super().get_next_year(date_)
+        found = self._adjacent_month(date_.year, 12, following=True)
+        return None if found is None else date(found[0], 1, 1)
+
+    def get_previous_year(self, date_):
+        if self.get_allow_empty():
+            return super().get_previous_year(date_)
+        found = self._adjacent_month(date_.year, 1, following=False)
+        return None if found is None else date(found[0], 1, 1)
+
+    def get_next_month(self, date_):
+        if self.get_allow_empty():
+            return super().get_next_month(date_)
+        found = self._adjacent_month(date_.year, date_.month, following=True)
+        return None if found is None else date(found[0], found[1], 1)
+
+    def get_previous_month(self, date_):
+        if self.get_allow_empty():
+            return super().get_previous_month(date_)
+        found = self._adjacent_month(date_.year, date_.month, following=False)
+        return None if found is None else date(found[0], found[1], 1)
+
+
+class PostRelationsMixin:
+    """ This mixin extends the list views of the blog: the products and the tags of the listed posts
+    are fetched in one query per relation, instead of one per post.
+    The views must be paginated, so that the prefetch never looks up more posts than a page holds."""
+    prefetch = ('products', 'tags')
+
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related(*self.prefetch)
@@ -1,37 +1,66 @@
-from django.shortcuts import get_object_or_404, redirect, render
+from datetime import datetime, time
+
+from django.db.models import prefetch_related_objects
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_http_methods
 from django.views.generic import ArchiveIndexView, CreateView, MonthArchiveView, View, YearArchiveView
 
+from core.cache import fragment_is_cached, models_changed_at, object_version
+from core.decorators import conditional_page, list_validators
+from product.models import Product, Tag
+from product.utils import CachedCountPaginator
 from .forms import PostForm
 from .models import Post
+from .utils import ArchiveSummaryMixin, PostRelationsMixin, get_post_or_404, month_bounds
+
+
+# the validators of the post detail page (see core.decorators.conditional_page)
+def post_validators(request, year, month, slug):
+    start, end = month_bounds(year, month)
+    post = (Post.objects
+            .filter(slug=slug.lower(), publication_date__gte=start, publication_date__lt=end)
+            .only('publication_date')
+            .first())
+    if post is None:
+        return None
+    published = timezone.make_aware(datetime.combine(post.publication_date, time.min))
+    return [object_version(post)], max(published, models_changed_at(Post, Product, Tag))
 
 
-class PostArchiveYear(YearArchiveView):
+class PostArchiveYear(PostRelationsMixin, ArchiveSummaryMixin, YearArchiveView):
     model = Post
     date_field = 'publication_date'
     make_object_list = True
+    paginate_by = 50
+    paginator_class = CachedCountPaginator
 
 
-class PostArchiveMonth(MonthArchiveView):
+class PostArchiveMonth(PostRelationsMixin, ArchiveSummaryMixin, MonthArchiveView):
     model = Post
     date_field = 'publication_date'
     month_format = '%m'
+    paginate_by = 50
+    paginator_class = CachedCountPaginator
 
 
 @require_http_methods(['HEAD', 'GET'])
+@conditional_page(post_validators)
 def post_detail(request, year, month, slug):
-    post = get_object_or_404(
-        Post,
-        publication_date__year=year,
-        publication_date__month=month,
-        slug=slug)
+    post = get_post_or_404(year, month, slug)
+    # the products and the tags are only needed if the page is not cached already
+    if not fragment_is_cached('post_detail', post):
+        prefetch_related_objects([post], 'products', 'tags')
     return render(
         request,
         'blog/post_detail.html',
         {'post': post})
 
 
-class PostList(ArchiveIndexView):
+# the posts are listed with their products and tags
+@method_decorator(conditional_page(list_validators(Post, Product, Tag)), name='dispatch')
+class PostList(PostRelationsMixin, ArchiveSummaryMixin, ArchiveIndexView):
     allow_empty = True
     allow_future = True
     context_object_name = 'post_list'
@@ -39,6 +68,7 @@ class PostList(ArchiveIndexView):
     make_object_list = True
     model = Post
     paginate_by = 5
+    paginator_class = CachedCountPaginator
     template_name = 'blog/post_list.html'
 
 
@@ -49,17 +79,11 @@ class PostCreate(CreateView):
 
 class PostDelete(View):
     def get(self, request, year, month, slug):
-        post = get_object_or_404(Post,
-                                 publication_date__year=year,
-                                 publication_date__month=month,
-                                 slug__iexact=slug)
+        post = get_post_or_404(year, month, slug)
         return render(request, 'blog/post_confirm_delete.html', {'post': post})
 
     def post(self, request, year, month, slug):
-        post = get_object_or_404(Post,
-                                 publication_date__year=year,
-                                 publication_date__month=month,
-                                 slug__iexact=slug)
+        post = get_post_or_404(year, month, slug)
         post.delete()
         return redirect('blog_post_list')
 
@@ -72,10 +96,7 @@ class PostUpdate(View):
     def get(self, request, year, month, slug):
         # check if the object we are looking for does exist;
         # if not, get http 404
-        post = get_object_or_404(self.model,
-                                 publication_date__year=year,
-                                 publication_date__month=month,
-                                 slug__iexact=slug)
+        post = get_post_or_404(year, month, slug)
         context = {'form': self.form_class(instance=post),
                    'post': post}
         return render(request, self.template_name, context)
@@ -83,10 +104,7 @@ class PostUpdate(View):
     def post(self, request, year, month, slug):
         # same as GET: before we try to update let's check
         # this object does actually exist
-        post = get_object_or_404(self.model,
-                                 publication_date__year=year,
-                                 publication_date__month=month,
-                                 slug__iexact=slug)
+        post = get_post_or_404(year, month, slug)
         bound_form = self.form_class(request.POST, instance=post)
         if bound_form.is_valid():
             new_post = bound_form.save()
@@ -1,6 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from django.core.mail import BadHeaderError, mail_managers
+from django.core.mail import BadHeaderError
+
+from outbox.models import QueuedMail
 
 
 class ContactForm(forms.Form):
@@ -32,7 +34,8 @@ class ContactForm(forms.Form):
         message_body = 'Message from: {}\n\n{}'.format(email, text)
 
         try:
-            mail_managers(cleaned_selection, message_body)
+            # queued for the send_queued_mail command, like mail_managers would send it
+            QueuedMail.objects.queue_managers(cleaned_selection, message_body)
         except BadHeaderError:
             self.add_error(None, ValidationError('Could not send the email.\n'
                                                  'Extra Headers are not allowed'
@@ -2,9 +2,11 @@ from django.contrib.messages import success
 from django.shortcuts import redirect, render
 from django.views.generic import View
 
+from core.ratelimit import ratelimit
 from .forms import ContactForm
 
 
+@ratelimit(('ip', '5/h'))
 class ContactView(View):
     form_class = ContactForm
     template_name = 'contact/contact_form.html'
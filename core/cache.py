@@ -0,0 +1,115 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.utils import timezone
+
+from .replicas import cache_variant
+
+
+# Everything cached on behalf of a model embeds the model "version" in its cache key: bumping the
+# version (i.e.: from a post_save or post_delete signal) invalidates all of those entries at once,
+# without having to know their keys.
+def _version_key(model):
+    return 'version:{}'.format(model._meta.label_lower)
+
+
+def _new_version():
+    # versions start from the clock, so that a version lost by the cache is never handed out again
+    return int(time.time() * 1000)
+
+
+def model_version(model):
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_model_version(sender, **kwargs):
+    """Signal receiver invalidating the entries cached against the version of the sender."""
+    key = _version_key(sender)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+    stamp_model_change(sender)
+
+
+# The time of the last change to the instances of a model, used for the Last-Modified headers.
+# When the cache does not know it, the only safe answer is: now.
+def _change_key(model):
+    return 'changed:{}'.format(model._meta.label_lower)
+
+
+def stamp_model_change(model):
+    cache.set(_change_key(model), timezone.now(), timeout=None)
+
+
+def model_changed_at(model):
+    key = _change_key(model)
+    changed_at = cache.get(key)
+    if changed_at is None:
+        cache.add(key, timezone.now(), timeout=None)
+        changed_at = cache.get(key)
+    return changed_at
+
+
+def models_changed_at(*models):
+    return max(model_changed_at(model) for model in models)
+
+
+# Single objects are versioned the same way, so that the fragments of their pages can be cached
+# with the version in the key (see the cache_version filter in core.templatetags.object_cache).
+# Their versions are random tokens: a whole batch of them is replaced with a single set_many.
+def _object_version_key(model, pk):
+    return 'version:{}:{}'.format(model._meta.label_lower, pk)
+
+
+def object_version(obj):
+    key = _object_version_key(type(obj), obj.pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_object_versions(model, pks):
+    cache.set_many({_object_version_key(model, pk): uuid.uuid4().hex for pk in pks}, timeout=None)
+
+
+def fragment_version(obj):
+    """The version to cache the fragments of the object under: its version, as read from the
+    primary or from the replicas (see core.replicas)."""
+    return '{}:{}'.format(object_version(obj), cache_variant())
+
+
+def fragment_is_cached(fragment_name, obj):
+    key = make_template_fragment_key(fragment_name, [obj.pk, fragment_version(obj)])
+    return cache.get(key) is not None
+
+
+def bump_m2m_versions(sender, instance, action, model, pk_set, **kwargs):
+    """m2m_changed receiver bumping the version of the objects on both sides of the changed rows."""
+    if action == 'pre_clear':
+        # by post_clear the rows are gone: remember which objects they pointed to
+        relations = [field for field in sender._meta.fields if field.is_relation]
+        source = next(field for field in relations if isinstance(instance, field.related_model))
+        target = next(field for field in relations if field.related_model is model)
+        instance._cleared_pks = list(sender.objects
+                                     .filter(**{source.attname: instance.pk})
+                                     .values_list(target.attname, flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if action == 'post_clear':
+            pk_set = getattr(instance, '_cleared_pks', ())
+        bump_object_versions(type(instance), [instance.pk])
+        bump_object_versions(model, pk_set)
+        # the (through) model of the relation is versioned too, for what was computed from its
+        # rows (i.e.: the counts of product.utils.cached_count)
+        bump_model_version(sender)
+        stamp_model_change(type(instance))
+        stamp_model_change(model)
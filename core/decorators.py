@@ -0,0 +1,88 @@
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+
+from .cache import model_version, models_changed_at
+from .replicas import cache_variant, current_replica, replicas_synced_at
+
+
+def _has_pending_messages(request):
+    # len() does not mark the messages as used, unlike iterating over them
+    return hasattr(request, '_messages') and len(get_messages(request)) > 0
+
+
+# the validators of a list page: it changes whenever any instance of the models changes
+def list_validators(*models):
+    def get_validators(request, *args, **kwargs):
+        return [model_version(model) for model in models], models_changed_at(*models)
+
+    return get_validators
+
+
+def conditional_page(get_validators):
+    """Decorate a read-only view with conditional GET support and, for anonymous visitors, a
+    shared page cache.
+
+    get_validators(request, *args, **kwargs) returns the cache versions the page depends upon and
+    the datetime of its last modification, or None when the object of the page does not exist.
+    Together with the URL, the visitor and the database the page is read from (see
+    core.replicas.cache_variant), the versions make the ETag, which is also the key of the cached
+    page: any change to the content yields a new page.
+
+    Pages are cached for ANONYMOUS_PAGE_CACHE_TIMEOUT seconds (None disables the cache): logged-in
+    users, pages carrying flash messages and pages with a CSRF token (i.e.: a form) are never cached.
+    Apply it to the dispatch method of class-based views with method_decorator."""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or _has_pending_messages(request):
+                return view_func(request, *args, **kwargs)
+            validators = get_validators(request, *args, **kwargs)
+            if validators is None:
+                return view_func(request, *args, **kwargs)
+            versions, changed_at = validators
+            if current_replica() is not None:
+                # the page read from a replica is as old as the replica (see core.replicas)
+                changed_at = max(changed_at, replicas_synced_at())
+            anonymous = not request.user.is_authenticated
+            visitor = 'anonymous' if anonymous else 'user-{}'.format(request.user.pk)
+            etag_source = ':'.join([str(version) for version in versions] +
+                                   [cache_variant(), visitor, request.get_full_path()])
+            etag = quote_etag(hashlib.md5(etag_source.encode('utf-8')).hexdigest())
+            last_modified = timegm(changed_at.utctimetuple())
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+
+            timeout = getattr(settings, 'ANONYMOUS_PAGE_CACHE_TIMEOUT', None)
+            use_cache = anonymous and timeout
+            key = 'page:{}'.format(etag.strip('"'))
+            if use_cache:
+                response = cache.get(key)
+                if response is not None:
+                    return response
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if callable(getattr(response, 'render', None)) and not response.is_rendered:
+                response.render()
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # the page changes when the visitor logs in
+            patch_vary_headers(response, ('Cookie',))
+            if use_cache and not request.META.get('CSRF_COOKIE_USED') and not response.cookies:
+                cache.set(key, response, timeout)
+            return response
+
+        return wrapped_view
+
+    return decorator
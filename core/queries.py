@@ -0,0 +1,137 @@
+import logging
+import re
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.decorators import method_decorator
+from django.views.generic import View
+
+logger = logging.getLogger(__name__)
+
+# The literals are stripped from the captured SQL, so that two queries differing only by their
+# parameters collapse into the same "shape". The same shape repeated over and over during a single
+# request is the signature of an N+1 loop in a template.
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN \(\?(?:, \?)*\)')
+
+
+def sql_shape(sql):
+    shape = STRING_LITERAL.sub('?', sql)
+    shape = NUMBER_LITERAL.sub('?', shape)
+    return IN_LIST.sub('IN (...)', shape)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    """Capture the queries run on every database connection (the replicas of core.replicas
+    included) and report how many, how long they took and which of them look like an N+1 loop."""
+
+    def __init__(self):
+        self.captures = [CaptureQueriesContext(connections[alias]) for alias in connections]
+
+    def __enter__(self):
+        for capture in self.captures:
+            capture.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for capture in reversed(self.captures):
+            capture.__exit__(exc_type, exc_value, traceback)
+
+    def __len__(self):
+        return sum(len(capture) for capture in self.captures)
+
+    @property
+    def captured_queries(self):
+        return [query for capture in self.captures for query in capture.captured_queries]
+
+    @property
+    def total_time(self):
+        return sum(float(query['time']) for query in self.captured_queries)
+
+    def repeated_shapes(self):
+        threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+        shapes = Counter(sql_shape(query['sql']) for query in self.captured_queries)
+        return [(shape, times) for shape, times in shapes.most_common() if times >= threshold]
+
+    def report(self, label, budget=None):
+        logger.info('{}: {} queries in {:.3f}s'.format(label, len(self), self.total_time))
+        for shape, times in self.repeated_shapes():
+            logger.warning('{}: query repeated {} times: {}'.format(label, times, shape))
+        if budget is not None and len(self) > budget:
+            msg = '{}: {} queries executed, the budget is {}'.format(label, len(self), budget)
+            logger.error(msg)
+            # the budget is only enforced when asked to (i.e.: by the test runner below)
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(msg)
+
+
+def _request_label(request):
+    return getattr(request.resolver_match, 'view_name', None) or request.path
+
+
+class QueryCountMiddleware:
+    """Log the number of queries (and their total time) issued by every request.
+    The middleware steps aside unless QUERY_COUNT_ENABLED (defaulting to DEBUG) is set."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_COUNT_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        counter.report(_request_label(request))
+        return response
+
+
+# Set a maximum number of queries for a view. It can be applied either to function views or,
+# like the decorators in account.decorators, to subclasses of View.
+def query_budget(max_queries):
+    def check_budget(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            with QueryCounter() as counter:
+                response = view_func(request, *args, **kwargs)
+                # most of the queries run while rendering the template: a lazy TemplateResponse
+                # must be rendered here, or they would escape the count
+                if callable(getattr(response, 'render', None)) and not response.is_rendered:
+                    response.render()
+            counter.report(_request_label(request), budget=max_queries)
+            return response
+
+        return wrapped_view
+
+    def decorator(view):
+        if isinstance(view, type):
+            if not issubclass(view, View):
+                raise ImproperlyConfigured('query_budget must be applied to function views'
+                                           ' or to subclasses of View class.')
+            view.dispatch = method_decorator(check_budget)(view.dispatch)
+            return view
+        return check_budget(view)
+
+    return decorator
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Test runner turning every query budget overrun into a test failure."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.strict_budget = override_settings(QUERY_BUDGET_STRICT=True)
+        self.strict_budget.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.strict_budget.disable()
+        super().teardown_test_environment(**kwargs)
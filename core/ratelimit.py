@@ -0,0 +1,168 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.utils.module_loading import import_string
+from django.views.generic import View
+
+# A rate is a number of requests per period ("5/m"): every key gets a bucket of that many tokens,
+# refilled at the same pace, and every request takes one token from the buckets of its keys.
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Return the capacity of the bucket and its refill rate, in tokens per second."""
+    try:
+        count, period = rate.split('/')
+        return int(count), int(count) / PERIODS[period]
+    except (ValueError, KeyError):
+        raise ImproperlyConfigured('Invalid rate {!r}: use "<number>/<s, m, h or d>".'.format(rate))
+
+
+def take_token(state, now, capacity, refill):
+    """Take a token from a bucket in the given state (None for a new bucket). Return the new state,
+    and how many seconds to wait for a token when the bucket is empty (0 when a token was taken)."""
+    tokens, stamp = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - stamp) * refill)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / refill
+
+
+class LocMemBackend:
+    """The buckets of this process, in a bounded LRU (RATELIMIT_LRU_SIZE buckets): the limits hold
+    per process."""
+
+    def __init__(self):
+        self.max_entries = getattr(settings, 'RATELIMIT_LRU_SIZE', 10000)
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill):
+        now = time.monotonic()
+        with self.lock:
+            state, wait = take_token(self.buckets.pop(key, None), now, capacity, refill)
+            self.buckets[key] = state
+            if len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBackend:
+    """The buckets in the default cache, shared by the processes using it. A bucket is read and written
+    without a lock: two concurrent requests may both get its last token."""
+
+    def consume(self, key, capacity, refill):
+        key = 'ratelimit:' + key
+        state, wait = take_token(cache.get(key), time.time(), capacity, refill)
+        # once full again, a bucket is as good as a new one
+        cache.set(key, state, timeout=int(capacity / refill) + 1)
+        return wait
+
+    def clear(self):
+        pass
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(settings, 'RATELIMIT_BACKEND', 'core.ratelimit.LocMemBackend'))()
+    return _backend
+
+
+# The keys of a request: "ip" is its address, "post:<field>" the value of a posted field (i.e.: the
+# username or the email). A request without the field is only limited by its other keys.
+def request_key(request, key):
+    if key == 'ip':
+        return request.META.get('REMOTE_ADDR', '')
+    if key.startswith('post:'):
+        return request.POST.get(key[len('post:'):], '').strip().lower() or None
+    raise ImproperlyConfigured('Invalid rate limit key {!r}: use "ip" or "post:<field>".'.format(key))
+
+
+def compile_rules(rules):
+    return [(key, ) + parse_rate(rate) for key, rate in rules]
+
+
+def check_rate_limits(request, scope, rules, methods=('POST',)):
+    """Take a token for every key of the request: return a 429 response if one of the buckets is
+    empty, or None."""
+    if request.method not in methods:
+        return None
+    backend = get_backend()
+    wait = 0
+    for key, capacity, refill in rules:
+        value = request_key(request, key)
+        if value is None:
+            continue
+        digest = hashlib.md5(value.encode()).hexdigest()
+        wait = max(wait, backend.consume('{}:{}:{}'.format(scope, key, digest), capacity, refill))
+    if wait:
+        response = HttpResponse('Too many requests: please try again later.', status=429,
+                                content_type='text/plain')
+        response['Retry-After'] = str(int(wait) + 1)
+        return response
+    return None
+
+
+# Limit the rate of the requests to a view, for every key of the rules: i.e.
+# @ratelimit(('ip', '10/m'), ('post:username', '5/m')). Like the decorators in account.decorators,
+# it can be applied to subclasses of View (and to function views as well).
+def ratelimit(*rules, methods=('POST',)):
+    compiled = compile_rules(rules)
+
+    def limit(view_func, scope):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            response = check_rate_limits(request, scope, compiled, methods)
+            if response is not None:
+                return response
+            return view_func(request, *args, **kwargs)
+
+        return wrapped_view
+
+    def decorator(view):
+        scope = '{}.{}'.format(view.__module__, view.__qualname__)
+        if isinstance(view, type):
+            if not issubclass(view, View):
+                raise ImproperlyConfigured('ratelimit must be applied to function views'
+                                           ' or to subclasses of View class.')
+            view.dispatch = method_decorator(lambda dispatch: limit(dispatch, scope))(view.dispatch)
+            return view
+        return limit(view, scope)
+
+    return decorator
+
+
+class RateLimitMiddleware:
+    """Apply the rules of the RATELIMITS setting to the views, by URL name: for the views we do not
+    write ourselves (i.e.: the login view of django.contrib.auth)."""
+
+    def __init__(self, get_response):
+        self.rules = {name: compile_rules(rules) for name, rules in getattr(settings, 'RATELIMITS', {}).items()}
+        if not self.rules:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        if view_name in self.rules:
+            return check_rate_limits(request, view_name, self.rules[view_name])
+        return None
@@ -0,0 +1,103 @@
+"""Read replicas for the catalogue and the blog.
+
+The GET requests to the views named in REPLICA_VIEWS read the models of the REPLICA_APPS from one
+of the DATABASE_REPLICAS, picked at random for the whole request; everything else, and every write,
+goes to the primary ("default") database.
+
+Replicas lag behind the primary: a client which just changed something (i.e.: a POST to a create,
+update or delete view) would not find its change on the page it is redirected to. Every unsafe
+request therefore sets a short-lived cookie, and the requests carrying it read from the primary
+for the next REPLICA_PIN_SECONDS seconds.
+
+For the same reason, what is cached against the versions of core.cache cannot be shared between
+the primary and the replicas: a page rendered from a replica, after a change bumped the versions on
+the primary, would be cached under the new versions with the old content. Such content is cached
+under the time of the last sync of the replicas as well (see cache_variant), which the
+sync_replicas command moves forward.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+PRIMARY = 'default'
+PIN_COOKIE = 'pin_primary'
+SYNC_KEY = 'replicas:synced'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# the replica serving the request of the current thread, if any
+_state = threading.local()
+
+
+def current_replica():
+    return getattr(_state, 'replica', None)
+
+
+# When the cache does not know the time of the last sync, the only safe answer is: now (see
+# core.cache.model_changed_at)
+def replicas_synced_at():
+    synced_at = cache.get(SYNC_KEY)
+    if synced_at is None:
+        cache.add(SYNC_KEY, timezone.now(), timeout=None)
+        synced_at = cache.get(SYNC_KEY)
+    return synced_at
+
+
+def stamp_replicas_sync():
+    cache.set(SYNC_KEY, timezone.now(), timeout=None)
+
+
+def cache_variant():
+    """The part of the cache keys telling apart the content read from the primary, and from the
+    replicas as of their last sync."""
+    if current_replica() is None:
+        return 'primary'
+    return 'replica-{}'.format(replicas_synced_at().timestamp())
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replica = current_replica()
+        if replica is not None and model._meta.app_label in settings.REPLICA_APPS:
+            return replica
+        return PRIMARY
+
+    # an object read from a replica is saved to the primary like any other
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY} | set(settings.DATABASE_REPLICAS)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """Serve the reads of the REPLICA_VIEWS from a replica, unless the client asked for the primary
+    by changing something in the last REPLICA_PIN_SECONDS."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in SAFE_METHODS
+                and PIN_COOKIE not in request.COOKIES
+                and request.resolver_match.view_name in settings.REPLICA_VIEWS):
+            _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        return None
@@ -0,0 +1,12 @@
+from django import template
+
+from core.cache import fragment_version
+
+register = template.Library()
+
+
+# Use it to vary the {% cache %} tag on the object version (see core.cache.fragment_version):
+#   {% cache 3600 product_detail product.pk product|cache_version %}
+@register.filter
+def cache_version(obj):
+    return fragment_version(obj)
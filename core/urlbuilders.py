@@ -0,0 +1,74 @@
+"""Precompiled reverse() for the URLs built for every row of the list pages.
+
+reverse() walks the namespaces, looks the name up and matches the arguments against the regular
+expression of the pattern at every call. A URLBuilder does the walk and the lookup once (per
+URLconf), keeps the "%(name)s" template of the pattern, and from then on only formats and quotes
+it. The arguments are NOT matched against the pattern: only build URLs from the fields the pattern
+was written for (i.e.: slugs, dates, primary keys).
+"""
+import re
+
+from django.core.urlresolvers import NoReverseMatch, get_resolver, get_script_prefix, get_urlconf, reverse
+from django.urls.resolvers import get_ns_resolver
+from django.utils.encoding import force_text
+from django.utils.http import RFC3986_SUBDELIMS, escape_leading_slashes, urlquote
+
+# the safe characters of reverse(): URLs made only of those (and of the unreserved characters)
+# need no quoting at all
+SAFE_CHARACTERS = RFC3986_SUBDELIMS + '/~:@'
+NOTHING_TO_QUOTE = re.compile(r'[\w.\-{}]*'.format(re.escape(SAFE_CHARACTERS)), re.ASCII)
+
+
+def compile_url_templates(resolver, view_name):
+    """The templates of the URL name, by set of keyword arguments, as reverse() would find them."""
+    parts = view_name.split(':')
+    view, namespaces = parts[-1], parts[:-1]
+    ns_pattern = ''
+    for namespace in namespaces:
+        # an application namespace stands for its default instance
+        instances = resolver.app_dict.get(namespace)
+        if instances and namespace not in instances:
+            namespace = instances[0]
+        try:
+            extra, resolver = resolver.namespace_dict[namespace]
+        except KeyError:
+            raise NoReverseMatch('{} is not a registered namespace'.format(namespace))
+        ns_pattern += extra
+    if ns_pattern:
+        resolver = get_ns_resolver(ns_pattern, resolver)
+
+    templates = {}
+    for possibilities, pattern, defaults in resolver.reverse_dict.getlist(view):
+        for template, params in possibilities:
+            # the extra arguments of the pattern (i.e.: the template_name of a view) are never
+            # passed when reversing: a captured argument named like one of them is left to reverse()
+            if not set(params) & set(defaults):
+                templates.setdefault(frozenset(params), template)
+    return templates
+
+
+class URLBuilder:
+    """Callable building the URL of view_name from keyword arguments, like reverse() would."""
+
+    def __init__(self, view_name):
+        self.view_name = view_name
+        self._compiled = (None, {})
+
+    def templates(self):
+        resolver = get_resolver(get_urlconf())
+        compiled_for, templates = self._compiled
+        # a new resolver (i.e.: another URLconf, or cleared URL caches) means compiling again
+        if compiled_for is not resolver:
+            templates = compile_url_templates(resolver, self.view_name)
+            self._compiled = (resolver, templates)
+        return templates
+
+    def __call__(self, **kwargs):
+        template = self.templates().get(frozenset(kwargs))
+        if template is None:
+            # let reverse() find a pattern with defaults, or raise the usual NoReverseMatch
+            return reverse(self.view_name, kwargs=kwargs)
+        url = get_script_prefix() + template % {name: force_text(value) for name, value in kwargs.items()}
+        if not NOTHING_TO_QUOTE.fullmatch(url):
+            url = urlquote(url, safe=SAFE_CHARACTERS)
+        return escape_leading_slashes(url)
@@ -1,5 +1,21 @@
+from django.db.models import prefetch_related_objects
 from django.views.generic import UpdateView as BaseUpdateView
 
+from .cache import fragment_is_cached
+
 
 class UpdateView(BaseUpdateView):
     template_name_suffix = '_form_update'
+
+
+class PrefetchUnlessCachedMixin:
+    """ This mixin extends a DetailView whose template caches the fragment 'fragment_name' of the
+    object (see core.templatetags.object_cache): the 'prefetch' relations of the object are only
+    fetched when the fragment has to be rendered again."""
+    fragment_name = None
+    prefetch = ()
+
+    def get_context_data(self, **kwargs):
+        if not fragment_is_cached(self.fragment_name, self.object):
+            prefetch_related_objects([self.object], *self.prefetch)
+        return super().get_context_data(**kwargs)
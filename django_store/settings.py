@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -26,6 +27,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# running the test suite ("manage.py test")
+TESTING = sys.argv[1:2] == ['test']
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -39,21 +43,47 @@ INSTALLED_APPS = [
     'blog',
     'core',
     'contact',
+    'outbox',
     'product',
+    'search',
 ]
 
 MIDDLEWARE = [
+    # first, so that the queries of all the other middlewares (sessions, auth...) are counted too
+    'core.queries.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Query counting
+# log the queries issued by each request (and the N+1 loops among them) to the "core.queries" logger;
+# views decorated with core.queries.query_budget fail the tests when they go over their budget
+
+QUERY_COUNT_ENABLED = DEBUG
+QUERY_REPEAT_THRESHOLD = 3
+TEST_RUNNER = 'core.queries.QueryBudgetTestRunner'
+
+# the costs of Argon2 come from the profile named by ARGON2_PROFILE (see account.hashers): the hashes made
+# with the costs of another profile are upgraded when their users log in. The production profile keeps the
+# two passes over 512 KiB of the Argon2 defaults of Django, on a single lane: a login keeps one core busy,
+# rather than two. Django hashes with Argon2i, which needs at least two passes (a single pass is open to
+# time-memory tradeoff attacks): lower the memory or the lanes to make the logins cheaper, never the
+# passes. The tests use the cheap profile
+ARGON2_PROFILES = {
+    'production': {'time_cost': 2, 'memory_cost': 512, 'parallelism': 1},
+    'fast': {'time_cost': 1, 'memory_cost': 8, 'parallelism': 1},
+}
+ARGON2_PROFILE = 'fast' if TESTING else 'production'
+
 PASSWORD_HASHERS = [
-    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'account.hashers.ProfiledArgon2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
     'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
@@ -92,6 +122,86 @@ DATABASES = {
     }
 }
 
+# Read replicas
+# the GET requests to the REPLICA_VIEWS read the models of the REPLICA_APPS from the DATABASE_REPLICAS
+# (see core.replicas). Locally, the replicas are DJANGO_STORE_REPLICAS copies of the database file,
+# refreshed by the sync_replicas command. The test runner creates two of them for the routing tests,
+# which turn them on: every other test reads from the primary
+
+REPLICA_COUNT = int(os.environ.get('DJANGO_STORE_REPLICAS', 2 if TESTING else 0))
+for replica in range(1, REPLICA_COUNT + 1):
+    DATABASES['replica{}'.format(replica)] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica{}.sqlite3'.format(replica)),
+    }
+DATABASE_REPLICAS = [] if TESTING else [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_APPS = ('product', 'blog')
+REPLICA_VIEWS = (
+    'product_product_list',
+    'product_product_detail',
+    'product_tag_list',
+    'product_tag_detail',
+    'blog_post_list',
+    'blog_post_archive_year',
+    'blog_post_archive_month',
+    'blog_post_detail',
+)
+# how long the client that changed something keeps reading from the primary
+REPLICA_PIN_SECONDS = 10
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+
+# the default cache holds the versions of the models and of the objects (see core.cache): every cached
+# fragment, page and count is keyed on them, and a change bumps them in the cache of the process making
+# it. They must therefore live in a cache shared by all the processes serving the site and by the
+# management commands (i.e.: memcached) as soon as there are more than one: with the per-process
+# LocMemCache, the other processes keep serving what they cached under their stale versions until it
+# expires
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # the sessions must live in a cache shared by all the processes serving the site (i.e.: memcached)
+    # as soon as there are more than one
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Sessions
+# the sessions are read from their cache, and written to the database only when their data changes, or
+# when their expiry date is more than SESSION_DB_REFRESH_INTERVAL seconds ahead of the stored one (see
+# account.sessions)
+
+SESSION_ENGINE = 'account.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_DB_REFRESH_INTERVAL = 3600
+
+# the flash messages travel in a signed cookie: showing or adding them never needs a session, so the anonymous
+# visitors never get one
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# the counts of the paginated list views are cached (see product.utils.cached_count), and only
+# estimated for unfiltered tables with more rows than the threshold
+COUNT_CACHE_TIMEOUT = 300
+APPROXIMATE_COUNT_THRESHOLD = 100000
+
+# Search
+# the backend storing the full-text index (see search.backends)
+
+SEARCH_BACKEND = 'search.backends.SQLiteFTSBackend'
+
+# anonymous visitors of the catalogue and blog pages share a page cache (see core.decorators);
+# set it to None to disable it
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 600
+
+# the public profiles are cached by slug, until they change (see account.signals)
+PUBLIC_PROFILE_CACHE_TIMEOUT = 3600
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -156,6 +266,19 @@ LOGGING = {
             'level': 'DEBUG',
             'formatter': 'verbose'
         },
+        'core.queries': {
+            'handlers': ['console'],
+            # the per-request counts would flood the test output, only the N+1 loops are shown there
+            'level': 'WARNING' if TESTING else 'INFO',
+            'propagate': False,
+        },
+        # the DEBUG messages of the missing template variables (i.e.: parent_template) print the
+        # whole context, evaluating every queryset in it once more
+        'django.template': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -170,6 +293,18 @@ MANAGERS = (
     ('Us', 'administrator@djangocart.org'),
 )
 
+# the mails are queued in the outbox by the views, and delivered by the send_queued_mail command:
+# a failed delivery is retried OUTBOX_MAX_ATTEMPTS times, waiting OUTBOX_RETRY_DELAY seconds
+# the first time and twice as long after every new failure
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_LEASE = 300
+
+# with EMAIL_BACKEND = 'outbox.backends.PooledSMTPBackend', every process keeps up to EMAIL_POOL_SIZE
+# connections open to the mail server, and replaces those left idle for EMAIL_POOL_IDLE_TIMEOUT seconds
+EMAIL_POOL_SIZE = 4
+EMAIL_POOL_IDLE_TIMEOUT = 30
+
 # Login Settings
 # https://docs.djangoproject.com/en/1.8/topics/auth/
 from django.core.urlresolvers import reverse_lazy
@@ -177,3 +312,25 @@ from django.core.urlresolvers import reverse_lazy
 LOGIN_REDIRECT_URL = reverse_lazy('dj-auth:login')
 LOGIN_URL = reverse_lazy('dj-auth:login')
 LOGOUT_URL = reverse_lazy('dj-auth:logout')
+
+# Authentication backends
+# request.user is loaded with its profile; the sessions naming the stock ModelBackend are handed to it
+# as well (see account.sessions)
+
+AUTHENTICATION_BACKENDS = ['account.backends.ProfileModelBackend']
+
+# Rate limits
+# the POST requests to the views named here are limited, for every key, to the given rate (see core.ratelimit);
+# our own views are limited by their ratelimit decorators. The token buckets live in RATELIMIT_BACKEND
+
+RATELIMIT_BACKEND = 'core.ratelimit.LocMemBackend'
+RATELIMIT_LRU_SIZE = 10000
+RATELIMITS = {
+    'dj-auth:login': [('ip', '20/m'), ('post:username', '5/m')],
+    'dj-auth:pw_reset_start': [('ip', '10/h'), ('post:email', '3/h')],
+}
+
+# Activation mails
+# the most activation mails per second delivered after a bulk resend (see account.utils.BulkActivationMailer)
+
+ACTIVATION_RESEND_RATE = 10
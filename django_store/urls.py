@@ -21,6 +21,7 @@ from account import urls as account_urls
 from blog import urls as blog_urls
 from contact import urls as contact_urls
 from product import urls as product_urls
+from search import urls as search_urls
 
 urlpatterns = [
     url(r'^$', RedirectView.as_view(pattern_name='blog_post_list')),
@@ -29,5 +30,6 @@ urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^blog/', include(blog_urls)),
     url(r'^contact/', include(contact_urls)),
+    url(r'^search/', include(search_urls)),
     url(r'^', include(product_urls)),
 ]
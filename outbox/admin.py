@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import QueuedMail
+
+
+class QueuedMailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'error_code', 'attempts', 'next_attempt', 'sent')
+    list_filter = ('status', 'error_code')
+    search_fields = ('subject', 'recipients')
+    date_hierarchy = 'created'
+
+
+admin.site.register(QueuedMail, QueuedMailAdmin)
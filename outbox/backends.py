@@ -0,0 +1,215 @@
+import atexit
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends import smtp
+from django.core.mail.message import sanitize_address
+
+
+class PooledConnection:
+    """An SMTP connection kept open between deliveries, with its throughput counters."""
+
+    def __init__(self, smtp_connection):
+        self.smtp = smtp_connection
+        self.opened = self.last_used = time.monotonic()
+        self.messages = 0
+        self.bytes = 0
+        # seconds spent sending messages
+        self.busy = 0.0
+
+    def count(self, size, seconds):
+        self.messages += 1
+        self.bytes += size
+        self.busy += seconds
+
+    @property
+    def throughput(self):
+        """Messages sent per second of work."""
+        return self.messages / self.busy if self.busy else 0.0
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'busy': self.busy,
+            'throughput': self.throughput,
+            'age': time.monotonic() - self.opened,
+        }
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+
+class SMTPConnectionPool:
+    """At most size connections to one server. A connection left idle for idle_timeout seconds
+    is not trusted anymore (the server has likely dropped it), and replaced with a new one."""
+
+    def __init__(self, size, idle_timeout):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        # the idle connections, the most recently used last
+        self.idle = []
+        self.connections = set()
+
+    def acquire(self, connect, timeout=None):
+        if not self.slots.acquire(timeout=timeout):
+            raise smtplib.SMTPException('No free connection in the pool.')
+        try:
+            while True:
+                with self.lock:
+                    pooled = self.idle.pop() if self.idle else None
+                if pooled is None:
+                    break
+                if time.monotonic() - pooled.last_used < self.idle_timeout:
+                    return pooled
+                self._drop(pooled)
+            pooled = PooledConnection(connect())
+            with self.lock:
+                self.connections.add(pooled)
+            return pooled
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, pooled, broken=False):
+        if broken:
+            self._drop(pooled)
+        else:
+            pooled.last_used = time.monotonic()
+            with self.lock:
+                self.idle.append(pooled)
+        self.slots.release()
+
+    def _drop(self, pooled):
+        with self.lock:
+            self.connections.discard(pooled)
+        pooled.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for pooled in idle:
+            self._drop(pooled)
+
+    def stats(self):
+        with self.lock:
+            return [pooled.stats() for pooled in self.connections]
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, size, idle_timeout):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SMTPConnectionPool(size, idle_timeout)
+        return _pools[key]
+
+
+def pool_stats():
+    """The counters of every pooled connection, by (host, port, username) of their server."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {key[:3]: pool.stats() for key, pool in pools}
+
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+class PooledSMTPBackend(smtp.EmailBackend):
+    """The SMTP backend of Django, keeping its connections open in a pool shared by the whole
+    process (at most EMAIL_POOL_SIZE connections per server): a message no longer pays for a
+    new connection, the greeting and the login. The connections left idle for
+    EMAIL_POOL_IDLE_TIMEOUT seconds are replaced, and a connection dropped by the server while
+    sending is reopened once."""
+
+    def __init__(self, pool_size=None, idle_timeout=None, **kwargs):
+        super().__init__(**kwargs)
+        key = (self.host, self.port, self.username, self.use_tls, self.use_ssl)
+        self.pool = get_pool(key,
+                             pool_size or getattr(settings, 'EMAIL_POOL_SIZE', 4),
+                             idle_timeout or getattr(settings, 'EMAIL_POOL_IDLE_TIMEOUT', 30))
+        self.pooled = None
+
+    def _connect(self):
+        # let the stock backend open (and log into) a new connection, then hand it to the pool
+        fail_silently, self.fail_silently = self.fail_silently, False
+        try:
+            super().open()
+        finally:
+            self.fail_silently = fail_silently
+        smtp_connection, self.connection = self.connection, None
+        return smtp_connection
+
+    def open(self):
+        if self.connection:
+            return False
+        try:
+            self.pooled = self.pool.acquire(self._connect, timeout=self.timeout)
+        except (smtplib.SMTPException, OSError):
+            if not self.fail_silently:
+                raise
+            return None
+        self.connection = self.pooled.smtp
+        # like for a new connection, the caller must close() it: that gives it back to the pool
+        return True
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.pool.release(self.pooled)
+        self.connection = self.pooled = None
+
+    def _reconnect(self):
+        self.pool.release(self.pooled, broken=True)
+        self.connection = self.pooled = None
+        self.pooled = self.pool.acquire(self._connect, timeout=self.timeout)
+        self.connection = self.pooled.smtp
+
+    def send_messages(self, email_messages):
+        opened_here = self.connection is None
+        try:
+            return super().send_messages(email_messages)
+        except BaseException:
+            # the stock backend leaves its connection open when a message fails: a pooled one
+            # must go back to the pool, or it would hold its place there for good
+            if opened_here:
+                self.close()
+            raise
+
+    def _deliver(self, email_message):
+        encoding = email_message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(email_message.from_email, encoding)
+        recipients = [sanitize_address(addr, encoding) for addr in email_message.recipients()]
+        data = email_message.message().as_bytes(linesep='\r\n')
+        started = time.monotonic()
+        self.connection.sendmail(from_email, recipients, data)
+        self.pooled.count(len(data), time.monotonic() - started)
+        return True
+
+    def _send(self, email_message):
+        if not email_message.recipients():
+            return False
+        try:
+            try:
+                return self._deliver(email_message)
+            except smtplib.SMTPServerDisconnected:
+                self._reconnect()
+                return self._deliver(email_message)
+        except (smtplib.SMTPException, OSError):
+            if not self.fail_silently:
+                raise
+            return False
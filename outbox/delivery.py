@@ -0,0 +1,92 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .models import QueuedMail, mail_error_code
+
+logger = logging.getLogger(__name__)
+
+
+def claim_due_mails(batch_size):
+    """Take a batch of the due mails for this worker. They are leased, rather than locked: if
+    the worker dies while delivering them, they are due again once OUTBOX_LEASE seconds are over."""
+    lease = timezone.now() + timedelta(seconds=getattr(settings, 'OUTBOX_LEASE', 300))
+    due = QueuedMail.objects.due().order_by('next_attempt', 'id')
+    if not db_connection.features.has_select_for_update_skip_locked:
+        # i.e.: SQLite, where select_for_update does nothing: the leases alone keep the workers apart
+        return lease_mails(list(due[:batch_size]), lease)
+    with transaction.atomic():
+        # where the database allows it, concurrent workers skip each other's rows
+        return lease_mails(list(due.select_for_update(skip_locked=True)[:batch_size]), lease)
+
+
+def lease_mails(mails, lease):
+    """Lease the mails read by this worker, and return those it got. Each lease is taken only if
+    the row still has the next_attempt that was read: of two workers which read the same rows,
+    only the first one to update them gets them."""
+    leased = []
+    for mail in mails:
+        taken = (QueuedMail.objects
+                 .filter(id=mail.id, status=QueuedMail.QUEUED, next_attempt=mail.next_attempt)
+                 .update(next_attempt=lease))
+        if taken:
+            mail.next_attempt = lease
+            leased.append(mail)
+    return leased
+
+
+def retry_later(mail, error_code):
+    """Back off exponentially from OUTBOX_RETRY_DELAY seconds, and give up after
+    OUTBOX_MAX_ATTEMPTS attempts."""
+    mail.attempts += 1
+    mail.error_code = error_code
+    if mail.attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5):
+        mail.status = QueuedMail.FAILED
+    else:
+        delay = getattr(settings, 'OUTBOX_RETRY_DELAY', 60) * 2 ** (mail.attempts - 1)
+        mail.next_attempt = timezone.now() + timedelta(seconds=delay)
+    mail.save(update_fields=['attempts', 'error_code', 'status', 'next_attempt'])
+
+
+def deliver(mail, connection):
+    try:
+        sent = connection.send_messages([mail.message()])
+    except Exception as error:
+        logger.error('Could not deliver mail {}: {!r}'.format(mail.pk, error))
+        retry_later(mail, mail_error_code(error))
+        return False
+    if not sent:
+        retry_later(mail, 'unknownerror')
+        return False
+    mail.status = QueuedMail.SENT
+    mail.error_code = ''
+    mail.attempts += 1
+    mail.sent = timezone.now()
+    mail.save(update_fields=['status', 'error_code', 'attempts', 'sent'])
+    return True
+
+
+def deliver_due_mails(batch_size=100):
+    """Deliver a batch of the due mails over a single connection to the mail server. The mails
+    go through OUTBOX_EMAIL_BACKEND (default: EMAIL_BACKEND). Return the number of mails
+    delivered and of mails which failed."""
+    mails = claim_due_mails(batch_size)
+    if not mails:
+        return 0, 0
+    connection = get_connection(getattr(settings, 'OUTBOX_EMAIL_BACKEND', None))
+    try:
+        connection.open()
+    except Exception as error:
+        logger.error('Could not connect to the mail server: {!r}'.format(error))
+        for mail in mails:
+            retry_later(mail, mail_error_code(error))
+        return 0, len(mails)
+    try:
+        delivered = sum(deliver(mail, connection) for mail in mails)
+    finally:
+        connection.close()
+    return delivered, len(mails) - delivered
@@ -0,0 +1,48 @@
+import time
+
+from django.core.mail import get_connection, send_mail
+from django.core.management.base import BaseCommand
+
+from outbox.backends import pool_stats
+from outbox.testing import LocalSMTPServer
+
+BACKENDS = (
+    ('stock', 'django.core.mail.backends.smtp.EmailBackend'),
+    ('pooled', 'outbox.backends.PooledSMTPBackend'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Compare the messages/sec of the stock SMTP backend with the pooled one, sending every'
+            ' message with its own send_mail call (like the views did) to a local SMTP server.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--host', help='Use this SMTP server rather than a local stand-in.')
+        parser.add_argument('--port', type=int, default=25)
+
+    def run(self, backend, host, port, messages):
+        started = time.perf_counter()
+        for n in range(messages):
+            send_mail('Message {}'.format(n), 'Hello there', 'no-reply@djangocart.org', ['user@example.org'],
+                      connection=get_connection(backend, host=host, port=port))
+        return messages / (time.perf_counter() - started)
+
+    def benchmark(self, host, port, messages):
+        rates = {}
+        for name, backend in BACKENDS:
+            rates[name] = self.run(backend, host, port, messages)
+            self.stdout.write('{:>8}: {:8.1f} messages/sec'.format(name, rates[name]))
+        self.stdout.write('speedup: {:.1f}x'.format(rates['pooled'] / rates['stock']))
+        for server, connections in pool_stats().items():
+            for stats in connections:
+                self.stdout.write('{} connection: {messages} messages, {throughput:.1f} messages/sec'.format(
+                    server[:2], **stats))
+
+    def handle(self, *args, **options):
+        if options['host']:
+            self.benchmark(options['host'], options['port'], options['messages'])
+        else:
+            with LocalSMTPServer() as server:
+                self.benchmark(server.host, server.port, options['messages'])
+                self.stdout.write('the server accepted {} connections'.format(server.connections))
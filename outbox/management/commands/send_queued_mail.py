@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from outbox.delivery import deliver_due_mails
+
+
+class Command(BaseCommand):
+    help = 'Deliver the mails waiting in the outbox, in batches sharing one connection to the mail server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of mails delivered over every connection.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, polling the outbox for new mails.')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait when the outbox is empty (with --loop).')
+
+    def handle(self, *args, **options):
+        while True:
+            delivered, failed = deliver_due_mails(options['batch_size'])
+            if delivered or failed:
+                self.stdout.write('Delivered {} mails, {} failed.'.format(delivered, failed))
+            # a full batch means there may be more mails waiting
+            if delivered + failed < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
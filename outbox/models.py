@@ -0,0 +1,98 @@
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import BadHeaderError, EmailMultiAlternatives
+from django.db import models
+from django.utils import timezone
+
+
+def mail_error_code(error):
+    """The error code of a failed delivery, as shown by the forms sending the mails."""
+    if isinstance(error, BadHeaderError):
+        return 'badheader'
+    if isinstance(error, SMTPException):
+        return 'smtperror'
+    return 'unexpectederror'
+
+
+class QueuedMailQuerySet(models.QuerySet):
+
+    def due(self):
+        return self.filter(status=QueuedMail.QUEUED, next_attempt__lte=timezone.now())
+
+
+class QueuedMailManager(models.Manager.from_queryset(QueuedMailQuerySet)):
+
+    # same arguments as django.core.mail.send_mail, but the mail is only stored: the
+    # send_queued_mail command will deliver it. A bad header is still refused right away.
+    def queue(self, subject, message, from_email, recipient_list, html_message=None):
+        mail = self.build(subject, message, from_email, recipient_list, html_message)
+        mail.save()
+        return mail
+
+    # the mail, checked but not saved yet: build many of them to queue them with bulk_create
+    def build(self, subject, message, from_email, recipient_list, html_message=None, **kwargs):
+        mail = self.model(subject=subject, body=message, html_body=html_message or '',
+                          from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+                          recipients='\n'.join(recipient_list), **kwargs)
+        mail.message()
+        return mail
+
+    # the queued counterpart of django.core.mail.mail_managers
+    def queue_managers(self, subject, message, html_message=None):
+        if not settings.MANAGERS:
+            return None
+        return self.queue(settings.EMAIL_SUBJECT_PREFIX + subject, message, settings.SERVER_EMAIL,
+                          [address for _, address in settings.MANAGERS], html_message=html_message)
+
+
+class QueuedMail(models.Model):
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    subject = models.TextField()
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    # one address per line
+    recipients = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # the code of the last failed delivery (see mail_error_code)
+    error_code = models.CharField(max_length=20, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    objects = QueuedMailManager()
+
+    class Meta:
+        # the worker looks for the queued mails that are due
+        indexes = [models.Index(fields=['status', 'next_attempt'])]
+
+    def __str__(self):
+        return '{} to {}'.format(self.subject, ', '.join(self.recipient_list))
+
+    @property
+    def recipient_list(self):
+        return self.recipients.splitlines()
+
+    @property
+    def mail_sent(self):
+        return self.status == self.SENT
+
+    def message(self, connection=None):
+        """The mail to deliver. Building its MIME message checks the headers, and raises
+        BadHeaderError if one of them is broken."""
+        message = EmailMultiAlternatives(self.subject, self.body, self.from_email, self.recipient_list,
+                                         connection=connection)
+        if self.html_body:
+            message.attach_alternative(self.html_body, 'text/html')
+        message.message()
+        return message
@@ -0,0 +1,53 @@
+import asyncore
+import smtpd
+import threading
+import time
+
+
+class LocalSMTPServer(smtpd.SMTPServer):
+    """An SMTP server on localhost keeping the messages it receives, to test (or benchmark) the
+    delivery of the mails without a real mail server. Use it as a context manager: it serves
+    from its own thread."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._map = {}
+        super().__init__((host, port), None, map=self._map, decode_data=False)
+        self.host, self.port = self.socket.getsockname()
+        self.messages = []
+        self.connections = 0
+        self._running = False
+        self._drop = threading.Event()
+
+    def handle_accepted(self, conn, addr):
+        self.connections += 1
+        super().handle_accepted(conn, addr)
+
+    def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+        self.messages.append((mailfrom, rcpttos, data))
+
+    def drop_connections(self):
+        """Hang up on the clients, like a server timing out their idle connections."""
+        self._drop.set()
+        while self._drop.is_set():
+            time.sleep(0.001)
+
+    def _serve(self):
+        while self._running:
+            asyncore.loop(timeout=0.01, map=self._map, count=1)
+            if self._drop.is_set():
+                for channel in list(self._map.values()):
+                    if channel is not self:
+                        channel.close()
+                self._drop.clear()
+
+    def __enter__(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._running = False
+        self._thread.join()
+        for channel in list(self._map.values()):
+            channel.close()
@@ -0,0 +1,182 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import BadHeaderError, send_mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .backends import PooledSMTPBackend
+from .delivery import deliver_due_mails, lease_mails
+from .models import QueuedMail
+from .testing import LocalSMTPServer
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException('mailbox unavailable')
+
+
+class UnreachableBackend(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError
+
+
+class OutboxTests(TestCase):
+
+    def queue(self, subject='Hello'):
+        return QueuedMail.objects.queue(subject, 'Body', None, ['user@example.org'])
+
+    def test_queued_mails_are_delivered_by_the_worker(self):
+        queued = self.queue()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(deliver_due_mails(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.org'])
+        queued.refresh_from_db()
+        self.assertTrue(queued.mail_sent)
+        self.assertIsNotNone(queued.sent)
+        # a delivered mail is never sent twice
+        self.assertEqual(deliver_due_mails(), (0, 0))
+
+    def test_workers_never_lease_the_same_mail(self):
+        self.queue()
+        self.queue()
+        # both workers read the due mails before either of them leases any
+        first, second = list(QueuedMail.objects.due()), list(QueuedMail.objects.due())
+        lease = timezone.now() + timedelta(seconds=300)
+        self.assertEqual(len(lease_mails(first, lease)), 2)
+        self.assertEqual(lease_mails(second, lease), [])
+        self.assertFalse(QueuedMail.objects.due().exists())
+
+    def test_bad_headers_are_refused_at_once(self):
+        with self.assertRaises(BadHeaderError):
+            self.queue('Hello\nBcc: everybody@example.org')
+        self.assertFalse(QueuedMail.objects.exists())
+
+    @override_settings(OUTBOX_EMAIL_BACKEND='outbox.tests.FailingBackend', OUTBOX_RETRY_DELAY=60,
+                       OUTBOX_MAX_ATTEMPTS=3)
+    def test_failed_deliveries_back_off_then_give_up(self):
+        queued = self.queue()
+        delays = []
+        for attempt in range(3):
+            QueuedMail.objects.filter(pk=queued.pk).update(next_attempt=timezone.now())
+            before = timezone.now()
+            self.assertEqual(deliver_due_mails(), (0, 1))
+            queued.refresh_from_db()
+            self.assertEqual(queued.error_code, 'smtperror')
+            delays.append(queued.next_attempt - before)
+        self.assertEqual(queued.status, QueuedMail.FAILED)
+        self.assertGreaterEqual(delays[1], timedelta(seconds=120))
+        self.assertLess(delays[0], timedelta(seconds=120))
+
+    @override_settings(OUTBOX_EMAIL_BACKEND='outbox.tests.UnreachableBackend')
+    def test_unreachable_server(self):
+        self.queue()
+        self.queue()
+        self.assertEqual(deliver_due_mails(), (0, 2))
+        self.assertFalse(QueuedMail.objects.due().exists())
+        self.assertEqual(QueuedMail.objects.filter(status=QueuedMail.QUEUED, attempts=1).count(), 2)
+
+    def test_command_delivers_in_batches(self):
+        for n in range(5):
+            self.queue('Hello {}'.format(n))
+        call_command('send_queued_mail', batch_size=2, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(QueuedMail.objects.due().exists())
+
+
+class QueuedFormTests(TestCase):
+
+    def test_account_creation_queues_the_activation_mail(self):
+        response = self.client.post(reverse('dj-auth:create'), {
+            'username': 'newuser', 'email': 'newuser@example.org',
+            'password1': 'a-long-passphrase', 'password2': 'a-long-passphrase'})
+        self.assertRedirects(response, reverse('dj-auth:create_done'))
+        self.assertEqual(len(mail.outbox), 0)
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.recipient_list, ['newuser@example.org'])
+        self.assertEqual(deliver_due_mails(), (1, 0))
+
+    def test_password_reset_queues_the_mail(self):
+        get_user_model().objects.create_user('user', 'user@example.org', 'a-long-passphrase')
+        self.client.post(reverse('dj-auth:pw_reset_start'), {'email': 'user@example.org'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedMail.objects.get().recipient_list, ['user@example.org'])
+
+    def test_contact_form_queues_the_mail_to_the_managers(self):
+        response = self.client.post(reverse('contact'), {
+            'email': 'user@example.org', 'text': 'Hi', 'contact_reason_selector': 'F'})
+        self.assertRedirects(response, reverse('blog_post_list'), fetch_redirect_response=False)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedMail.objects.get().recipient_list, ['administrator@djangocart.org'])
+
+
+class PooledSMTPBackendTests(TestCase):
+
+    def setUp(self):
+        self.server = LocalSMTPServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def backend(self, **kwargs):
+        return PooledSMTPBackend(host=self.server.host, port=self.server.port, **kwargs)
+
+    def send(self, n, **kwargs):
+        for i in range(n):
+            send_mail('Message {}'.format(i), 'Body', 'no-reply@example.org', ['user@example.org'],
+                      connection=self.backend(**kwargs))
+
+    def test_connections_are_reused(self):
+        self.send(5)
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.connections, 1)
+        [stats] = self.backend().pool.stats()
+        self.assertEqual(stats['messages'], 5)
+        self.assertGreater(stats['bytes'], 0)
+        self.assertGreater(stats['throughput'], 0)
+
+    def test_dropped_connections_are_reopened(self):
+        self.send(1)
+        self.server.drop_connections()
+        self.send(1)
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_idle_connections_are_replaced(self):
+        self.send(1, idle_timeout=0.01)
+        time.sleep(0.02)
+        self.send(1, idle_timeout=0.01)
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(len(self.backend().pool.stats()), 1)
+
+    def test_pool_is_bounded(self):
+        first = self.backend(pool_size=1, timeout=0.1)
+        first.open()
+        with self.assertRaises(SMTPException):
+            self.backend(pool_size=1, timeout=0.1).open()
+        first.close()
+        self.assertIs(self.backend(pool_size=1, timeout=0.1).open(), True)
+
+    def test_failed_message_gives_the_connection_back(self):
+        backend = self.backend(pool_size=1, timeout=0.1)
+        message = mail.EmailMessage('Hello', 'Body', 'no-reply@example.org', ['user@example.org'],
+                                    connection=backend)
+        with self.assertRaises(BadHeaderError):
+            send_mail('Hello\nBcc: x@example.org', 'Body', 'no-reply@example.org', ['user@example.org'],
+                      connection=backend)
+        self.assertEqual(message.send(), 1)
+
+    def test_worker_delivers_through_the_pool(self):
+        for n in range(3):
+            QueuedMail.objects.queue('Hello', 'Body', None, ['user@example.org'])
+        with self.settings(OUTBOX_EMAIL_BACKEND='outbox.backends.PooledSMTPBackend',
+                           EMAIL_HOST=self.server.host, EMAIL_PORT=self.server.port):
+            self.assertEqual(deliver_due_mails(), (3, 0))
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 1)
@@ -1,5 +1,35 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 
 
 class ProductConfig(AppConfig):
     name = 'product'
+
+    def ready(self):
+        from core.cache import bump_m2m_versions, bump_model_version
+        from .facets import index_tagged, unindex_tag, unindex_tagged
+        from .signals import count_tagged, link_changed, product_changed, tag_changed, uncount_tagged
+
+        # whatever is cached against the version of a model (i.e.: the counts of the paginated
+        # list views) expires as soon as one of its instances is saved or deleted
+        for model_name in ('Product', 'Tag', 'Link'):
+            model = self.get_model(model_name)
+            post_save.connect(bump_model_version, sender=model)
+            post_delete.connect(bump_model_version, sender=model)
+
+        # the cached fragments of the detail pages expire when their object, or one of the objects
+        # they display, changes
+        for model_name, receiver in (('Product', product_changed),
+                                     ('Tag', tag_changed),
+                                     ('Link', link_changed)):
+            model = self.get_model(model_name)
+            for signal in (post_save, pre_delete, post_delete):
+                signal.connect(receiver, sender=model)
+        m2m_changed.connect(bump_m2m_versions, sender=self.get_model('Product').tags.through)
+        # the counters of the tags
+        m2m_changed.connect(count_tagged, sender=self.get_model('Product').tags.through)
+        pre_delete.connect(uncount_tagged, sender=self.get_model('Product'))
+        # and the facets
+        m2m_changed.connect(index_tagged, sender=self.get_model('Product').tags.through)
+        post_delete.connect(unindex_tagged, sender=self.get_model('Product'))
+        post_delete.connect(unindex_tag, sender=self.get_model('Tag'))
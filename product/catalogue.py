@@ -0,0 +1,253 @@
+"""Bulk import and export of the catalogue (see the import_catalogue and export_catalogue commands).
+
+A catalogue file holds one row per tag, product or link, either as CSV (with the COLUMNS header)
+or as JSON lines. The "type" of a row tells which of them it is:
+
+    tag:     name, slug
+    product: name, slug, description, tags (the slugs of its tags, space separated in CSV)
+    link:    title, publication_date, link_url, product (the slug of the product)
+
+Tags and products must come before the rows referring to them.
+"""
+import csv
+import json
+
+from django.apps import apps
+
+from core.cache import bump_model_version, bump_object_versions
+from .facets import invalidate_facets
+from .forms import LinkForm, ProductForm, TagForm
+from search.backends import get_backend
+from .models import Link, Product, Tag
+
+COLUMNS = ('type', 'name', 'slug', 'description', 'tags', 'title', 'publication_date', 'link_url', 'product')
+FORMATS = ('csv', 'jsonl')
+
+
+def read_rows(stream, format):
+    if format == 'csv':
+        for row in csv.DictReader(stream):
+            row['tags'] = (row.get('tags') or '').split()
+            yield row
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_rows(stream, format, rows):
+    if format == 'csv':
+        writer = csv.DictWriter(stream, COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            if 'tags' in row:
+                row['tags'] = ' '.join(row['tags'])
+            writer.writerow(row)
+    else:
+        for row in rows:
+            stream.write(json.dumps(row) + '\n')
+
+
+def export_rows():
+    """Stream the whole catalogue, without ever holding it in memory."""
+    for name, slug in Tag.objects.order_by('id').values_list('name', 'slug').iterator():
+        yield {'type': 'tag', 'name': name, 'slug': slug}
+
+    # walk the products and their tag rows side by side, both ordered by product
+    through = Product.tags.through.objects.order_by('product_id', 'tag_id')
+    product_tags = iter(through.values_list('product_id', 'tag__slug').iterator())
+    pending = next(product_tags, None)
+    products = Product.objects.order_by('id').values_list('id', 'name', 'slug', 'description')
+    for pk, name, slug, description in products.iterator():
+        tags = []
+        while pending is not None and pending[0] == pk:
+            tags.append(pending[1])
+            pending = next(product_tags, None)
+        yield {'type': 'product', 'name': name, 'slug': slug, 'description': description or '', 'tags': tags}
+
+    links = Link.objects.order_by('id').values_list('title', 'publication_date', 'link_url', 'product__slug')
+    for title, publication_date, link_url, product in links.iterator():
+        yield {'type': 'link', 'title': title, 'publication_date': publication_date.isoformat(),
+               'link_url': link_url, 'product': product}
+
+
+class BulkFormMixin:
+    # the uniqueness of the slugs (and of the tag names) is checked once per batch by the
+    # importer: checking it here would cost a query for every row
+    def validate_unique(self):
+        pass
+
+
+class BulkTagForm(BulkFormMixin, TagForm):
+    pass
+
+
+# the relations are resolved by the importer as well, from the slugs in the rows
+class BulkProductForm(BulkFormMixin, ProductForm):
+    class Meta(ProductForm.Meta):
+        exclude = ('tags',)
+
+
+class BulkLinkForm(BulkFormMixin, LinkForm):
+    class Meta(LinkForm.Meta):
+        exclude = ('product',)
+
+
+class CatalogueImporter:
+    """Validate the rows with the rules of the catalogue forms, and write them with bulk_create
+    in batches of batch_size rows (keep it below 999, the limit of SQLite to the query parameters)."""
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.tags, self.products, self.links = [], [], []
+        # the slugs of the tags and the tag ids of the products in the current batches
+        self.tag_slugs, self.product_tags = set(), {}
+        # the ids of all the tags, by slug
+        self.tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        self.errors = []
+        self.created = {'tag': 0, 'product': 0, 'link': 0}
+        self.touched_products, self.touched_tags = set(), set()
+        # the ids of the tags and products written, to be added to the search index
+        self.new_tags, self.new_products = set(), set()
+
+    def error(self, line, message):
+        self.errors.append('line {}: {}'.format(line, message))
+
+    def add(self, line, row):
+        kind = row.get('type')
+        if kind == 'tag':
+            self.add_tag(line, row)
+        elif kind == 'product':
+            self.add_product(line, row)
+        elif kind == 'link':
+            self.add_link(line, row)
+        else:
+            self.error(line, 'unknown row type {!r}'.format(kind))
+        if max(len(self.tags), len(self.products), len(self.links)) >= self.batch_size:
+            self.flush()
+
+    def clean(self, line, form_class, row):
+        form = form_class(data=row)
+        if not form.is_valid():
+            self.error(line, '; '.join('{}: {}'.format(field, ' '.join(errors))
+                                       for field, errors in form.errors.items()))
+            return None
+        return form.save(commit=False)
+
+    def add_tag(self, line, row):
+        tag = self.clean(line, BulkTagForm, row)
+        if tag is None:
+            return
+        if tag.slug in self.tag_ids or tag.slug in self.tag_slugs:
+            self.error(line, 'a tag with slug "{}" already exists'.format(tag.slug))
+            return
+        self.tags.append((line, tag))
+        self.tag_slugs.add(tag.slug)
+
+    def add_product(self, line, row):
+        # the tags must be known by the time the product is written
+        self.flush_tags()
+        product = self.clean(line, BulkProductForm, row)
+        if product is None:
+            return
+        missing = [slug for slug in row.get('tags') or () if slug not in self.tag_ids]
+        if missing:
+            self.error(line, 'unknown tags: {}'.format(', '.join(missing)))
+            return
+        if product.slug in self.product_tags:
+            self.error(line, 'a product with slug "{}" already exists'.format(product.slug))
+            return
+        self.products.append((line, product))
+        self.product_tags[product.slug] = [self.tag_ids[slug] for slug in row.get('tags') or ()]
+
+    def add_link(self, line, row):
+        link = self.clean(line, BulkLinkForm, row)
+        if link is not None:
+            self.links.append((line, link, row.get('product') or ''))
+
+    def flush_tags(self):
+        if not self.tags:
+            return
+        existing = set(Tag.objects
+                       .filter(name__in=[tag.name for _, tag in self.tags])
+                       .values_list('name', flat=True))
+        tags = []
+        for line, tag in self.tags:
+            if tag.name in existing:
+                self.error(line, 'a tag named "{}" already exists'.format(tag.name))
+            else:
+                existing.add(tag.name)
+                tags.append(tag)
+        Tag.objects.bulk_create(tags)
+        slugs = [tag.slug for tag in tags]
+        new_tag_ids = dict(Tag.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+        self.tag_ids.update(new_tag_ids)
+        self.new_tags.update(new_tag_ids.values())
+        self.created['tag'] += len(tags)
+        self.tags, self.tag_slugs = [], set()
+
+    def flush_products(self):
+        if not self.products:
+            return
+        slugs = [product.slug for _, product in self.products]
+        existing = set(Product.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+        products = []
+        for line, product in self.products:
+            if product.slug in existing:
+                self.error(line, 'a product with slug "{}" already exists'.format(product.slug))
+            else:
+                products.append(product)
+        Product.objects.bulk_create(products)
+        # bulk_create does not give us the primary keys back on every database: look them up
+        product_ids = dict(Product.objects
+                           .filter(slug__in=[product.slug for product in products])
+                           .values_list('slug', 'id'))
+        Through = Product.tags.through
+        Through.objects.bulk_create(
+            Through(product_id=product_ids[product.slug], tag_id=tag_id)
+            for product in products
+            for tag_id in self.product_tags[product.slug])
+        for product in products:
+            self.touched_tags.update(self.product_tags[product.slug])
+        self.new_products.update(product_ids.values())
+        self.created['product'] += len(products)
+        self.products, self.product_tags = [], {}
+
+    def flush_links(self):
+        if not self.links:
+            return
+        product_ids = dict(Product.objects
+                           .filter(slug__in={slug for _, _, slug in self.links})
+                           .values_list('slug', 'id'))
+        links = []
+        for line, link, slug in self.links:
+            if slug not in product_ids:
+                self.error(line, 'unknown product "{}"'.format(slug))
+            else:
+                link.product_id = product_ids[slug]
+                links.append(link)
+                self.touched_products.add(link.product_id)
+        Link.objects.bulk_create(links)
+        self.created['link'] += len(links)
+        self.links = []
+
+    def flush(self):
+        self.flush_tags()
+        self.flush_products()
+        self.flush_links()
+
+    def finish(self):
+        self.flush()
+        # bulk_create sends no signal: expire the cached counts and pages, and count the tags, by hand
+        for model in (Tag, Product, Link):
+            bump_model_version(model)
+        bump_object_versions(Tag, self.touched_tags)
+        touched_tags = sorted(self.touched_tags)
+        for start in range(0, len(touched_tags), self.batch_size):
+            Tag.objects.filter(pk__in=touched_tags[start:start + self.batch_size]).recount()
+        invalidate_facets()
+        bump_object_versions(Product, self.touched_products)
+        # nor does it reach the receivers keeping the search index up to date
+        search = get_backend()
+        search.update(apps, 'tag', self.new_tags, self.batch_size)
+        search.update(apps, 'product', self.new_products, self.batch_size)
@@ -0,0 +1,331 @@
+"""In memory facets of the catalogue: which products and which posts carry every tag.
+
+Each tag has one "posting" per kind of tagged object, in either of two forms. The posting of a
+tag carried by many objects is a bitmap, held in a python int, whose bit N is set when the object
+with primary key N carries the tag: the objects having tags A AND B are then the bits of
+postings[A] & postings[B], computed without touching the database. The posting of a tag carried
+by few objects (most of them, in a large catalogue) is the sorted array of their primary keys,
+much smaller than a bitmap as long as the highest primary key. Next to the postings, the index
+keeps the tags of every object: the objects of a small posting are checked against the other tags
+one by one, and the tags counted by refinements are only those carried by the objects matched.
+
+The index is built once per process, from the tags tables of Product and Post, and kept up to date
+by the receivers below. Every change also bumps a generation number, kept in the database so that
+every process sees it whatever its cache (see FacetGeneration): a process whose index has missed a
+change (made by another process, i.e. a management command, or by a bulk_create sending no signal)
+finds a newer generation there, and builds its index again. The changes reach the index, and the
+generation, only once their transaction commits: a rolled back change leaves both untouched.
+
+An index handed out by get_index is never changed: the changes are applied to a copy, which then
+takes its place. The threads reading the index need no lock, and never see a change half made.
+"""
+import operator
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from functools import reduce
+from itertools import chain, islice
+
+from django.db import connections, router, transaction
+from django.db.models import F
+
+from .models import FacetGeneration, Product, Tag
+from .signals import tagged_fields
+
+GENERATION_PK = 1
+NON_ZERO_BYTE = re.compile(b'[^\x00]')
+# the positions of the bits set in every byte value
+BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+# the arrays of primary keys (or of tag ids) hold 64 bits integers
+ARRAY_TYPECODE = 'q'
+ARRAY_ITEM_BITS = 64
+
+
+def to_bitmap(pks):
+    pks = list(pks)
+    if not pks:
+        return 0
+    data = bytearray(max(pks) // 8 + 1)
+    for pk in pks:
+        data[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(data, 'little')
+
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+def iter_bits(bitmap):
+    """The positions of the bits set in the bitmap, in increasing order."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    # the regular expression skips the (many) empty bytes in C
+    for match in NON_ZERO_BYTE.finditer(data):
+        offset = match.start() * 8
+        for bit in BYTE_BITS[data[match.start()]]:
+            yield offset + bit
+
+
+def to_posting(pks):
+    """The posting of the sorted, distinct primary keys: the smallest of their array and their bitmap."""
+    if len(pks) * ARRAY_ITEM_BITS < pks[-1] + 1:
+        return array(ARRAY_TYPECODE, pks)
+    return to_bitmap(pks)
+
+
+def posting_size(posting):
+    return popcount(posting) if isinstance(posting, int) else len(posting)
+
+
+def posting_pks(posting):
+    return iter_bits(posting) if isinstance(posting, int) else iter(posting)
+
+
+class FacetResult:
+    """The primary keys of a posting, as a sequence django's Paginator can slice."""
+
+    def __init__(self, posting):
+        self.posting = posting
+        self._count = None
+
+    def __len__(self):
+        if self._count is None:
+            self._count = posting_size(self.posting)
+        return self._count
+
+    def __getitem__(self, index):
+        if not isinstance(self.posting, int):
+            return list(self.posting[index]) if isinstance(index, slice) else self.posting[index]
+        if isinstance(index, slice):
+            if index.step is not None:
+                raise ValueError('FacetResult does not support slice steps.')
+            return list(islice(iter_bits(self.posting), index.start, index.stop))
+        pks = list(islice(iter_bits(self.posting), index, index + 1))
+        if not pks:
+            raise IndexError(index)
+        return pks[0]
+
+
+class FacetIndex:
+
+    def __init__(self, generation):
+        self.generation = generation
+        # {kind: {tag id: posting}}, the kind being the model name of the tagged objects
+        self.postings = {model._meta.model_name: {} for model in tagged_models()}
+        # {kind: {object pk: array of its tag ids}}
+        self.tags = {kind: {} for kind in self.postings}
+
+    @classmethod
+    def build(cls, generation, using):
+        index = cls(generation)
+        for model in tagged_models():
+            through = model.tags.through
+            tagged = tagged_fields(through)[1].attname
+            rows = through.objects.using(using).order_by('tag_id', tagged).values_list('tag_id', tagged).iterator()
+            kind = model._meta.model_name
+            postings, tags = index.postings[kind], {}
+            # the rows come grouped by tag: every posting is built in one go
+            tag_id, pks = None, []
+            for row_tag_id, pk in rows:
+                if row_tag_id != tag_id:
+                    if pks:
+                        postings[tag_id] = to_posting(pks)
+                    tag_id, pks = row_tag_id, []
+                pks.append(pk)
+                tags.setdefault(pk, []).append(tag_id)
+            if pks:
+                postings[tag_id] = to_posting(pks)
+            index.tags[kind] = {pk: array(ARRAY_TYPECODE, tag_ids) for pk, tag_ids in tags.items()}
+        return index
+
+    def copy(self):
+        # the postings and the arrays of tags are replaced by the changes, never changed in place:
+        # the copies of the dictionaries holding them are enough
+        index = FacetIndex(self.generation)
+        index.postings = {kind: dict(postings) for kind, postings in self.postings.items()}
+        index.tags = {kind: dict(tags) for kind, tags in self.tags.items()}
+        return index
+
+    def _update(self, kind, tag_id, pks, adding):
+        postings = self.postings[kind]
+        posting = postings.get(tag_id, 0)
+        if isinstance(posting, int):
+            posting = posting | to_bitmap(pks) if adding else posting & ~to_bitmap(pks)
+            # a bitmap thinned out by the removals turns into an array
+            if posting and popcount(posting) * ARRAY_ITEM_BITS < posting.bit_length():
+                posting = array(ARRAY_TYPECODE, iter_bits(posting))
+        else:
+            pks = sorted(set(posting).union(pks) if adding else set(posting).difference(pks))
+            posting = to_posting(pks) if pks else 0
+        if posting_size(posting):
+            postings[tag_id] = posting
+        else:
+            postings.pop(tag_id, None)
+
+    def _update_tags(self, kind, pk, tag_ids, adding):
+        tags = self.tags[kind]
+        current = set(tags.get(pk, ()))
+        current = current.union(tag_ids) if adding else current.difference(tag_ids)
+        if current:
+            tags[pk] = array(ARRAY_TYPECODE, sorted(current))
+        else:
+            tags.pop(pk, None)
+
+    def add(self, kind, tag_id, pks):
+        pks = set(pks)
+        self._update(kind, tag_id, pks, adding=True)
+        for pk in pks:
+            self._update_tags(kind, pk, [tag_id], adding=True)
+
+    def remove(self, kind, tag_id, pks):
+        pks = set(pks)
+        self._update(kind, tag_id, pks, adding=False)
+        for pk in pks:
+            self._update_tags(kind, pk, [tag_id], adding=False)
+
+    def discard_object(self, kind, pk):
+        for tag_id in self.tags[kind].pop(pk, ()):
+            self._update(kind, tag_id, [pk], adding=False)
+
+    def discard_tag(self, tag_id):
+        for kind, postings in self.postings.items():
+            posting = postings.pop(tag_id, None)
+            if posting is not None:
+                for pk in posting_pks(posting):
+                    self._update_tags(kind, pk, [tag_id], adding=False)
+
+    def match(self, kind, tag_ids):
+        """The objects of the kind carrying all of the tags."""
+        postings = self.postings[kind]
+        selected = [postings.get(tag_id) for tag_id in set(tag_ids)]
+        if None in selected:
+            return FacetResult(0)
+        arrays = [posting for posting in selected if not isinstance(posting, int)]
+        if not arrays:
+            return FacetResult(reduce(operator.and_, selected))
+        # the smallest posting is walked, and its objects checked for the other tags
+        smallest = min(arrays, key=len)
+        if len(selected) == 1:
+            return FacetResult(smallest)
+        required, tags = set(tag_ids), self.tags[kind]
+        return FacetResult(array(ARRAY_TYPECODE, (pk for pk in smallest if required.issubset(tags[pk]))))
+
+    def refinements(self, kind, result):
+        """The number of objects of the result carrying each tag, for the tags carried by any."""
+        # only the tags of the objects matched are met, however many tags there are
+        tags = self.tags[kind]
+        return dict(Counter(chain.from_iterable(map(tags.__getitem__, posting_pks(result.posting)))))
+
+
+def tagged_models():
+    return (Product, Tag._meta.get_field('post').related_model)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _database():
+    # the index serves the whole process: it is read from the primary database, never from the
+    # replica of a request (see core.replicas)
+    return router.db_for_write(FacetGeneration)
+
+
+def _new_generation():
+    # a lost row starts again from the clock, so that a generation is never handed out twice
+    return int(time.time() * 1000)
+
+
+def _generation(using):
+    generations = FacetGeneration.objects.using(using)
+    generation = generations.filter(pk=GENERATION_PK).values_list('generation', flat=True).first()
+    if generation is None:
+        generation = generations.get_or_create(pk=GENERATION_PK,
+                                               defaults={'generation': _new_generation()})[0].generation
+    return generation
+
+
+def _bump_generation(using):
+    """The new generation, or None if there was none yet."""
+    if not FacetGeneration.objects.using(using).filter(pk=GENERATION_PK).update(generation=F('generation') + 1):
+        return None
+    return _generation(using)
+
+
+def get_index():
+    global _index
+    using = _database()
+    generation = _generation(using)
+    with _lock:
+        if _index is None or _index.generation != generation:
+            index = FacetIndex.build(generation, using)
+            if connections[using].in_atomic_block:
+                # the transaction may still roll back some of the rows read: only this caller gets them
+                return index
+            _index = index
+        return _index
+
+
+def _apply(change=None):
+    """Apply the change to the index of this process (if any), and publish a new generation.
+    Without a change, the index of this process is dropped as well."""
+    global _index
+    with _lock:
+        index = None
+        if change is not None and _index is not None:
+            index = _index.copy()
+            change(index)
+        generation = _bump_generation(_database())
+        if index is not None and generation is not None and index.generation == generation - 1:
+            index.generation = generation
+            _index = index
+        else:
+            # dropped, or somebody else changed the tags meanwhile: build the index again on the next use
+            _index = None
+
+
+def invalidate_facets():
+    """Make every process build its index again, i.e. after a bulk_create of tagged objects."""
+    transaction.on_commit(_apply)
+
+
+def index_tagged(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """m2m_changed receiver of the tags of Product and Post, from either side of the relation."""
+    tag, tagged = tagged_fields(sender)
+    source, target = (tag, tagged) if reverse else (tagged, tag)
+    if action == 'pre_clear':
+        rows = sender.objects.filter(**{source.attname: instance.pk})
+        instance._facet_cleared_pks = set(rows.values_list(target.attname, flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_facet_cleared_pks', ())
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if not pk_set:
+        return
+    kind = tagged.related_model._meta.model_name
+    update = FacetIndex.add if action == 'post_add' else FacetIndex.remove
+    pk, pk_set = instance.pk, set(pk_set)
+
+    def change(index):
+        if reverse:
+            update(index, kind, pk, pk_set)
+        else:
+            for tag_id in pk_set:
+                update(index, kind, tag_id, [pk])
+
+    transaction.on_commit(lambda: _apply(change))
+
+
+def unindex_tagged(sender, instance, **kwargs):
+    """post_delete receiver of Product and Post: their tags rows are gone."""
+    # the primary key of a deleted instance is reset before the commit
+    kind, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: _apply(lambda index: index.discard_object(kind, pk)))
+
+
+def unindex_tag(sender, instance, **kwargs):
+    """post_delete receiver of Tag."""
+    pk = instance.pk
+    transaction.on_commit(lambda: _apply(lambda index: index.discard_tag(pk)))
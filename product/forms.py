@@ -6,11 +6,13 @@ from .models import Link, Product, Tag
 
 class SlugCleanMixin:
     """Mixin Class for the common "clean_slug" methods in the forms."""
+    # the paths matched before the detail pages of the same model
+    reserved_slugs = ('create',)
 
     def clean_slug(self):
         new_slug = self.cleaned_data['slug'].lower()
-        if new_slug == 'create':
-            raise ValidationError('Slug cannot be "create". That is a reserved word')
+        if new_slug in self.reserved_slugs:
+            raise ValidationError('Slug cannot be "{}". That is a reserved word'.format(new_slug))
         return new_slug
 
 
@@ -27,6 +29,8 @@ class ProductForm(SlugCleanMixin, forms.ModelForm):
 
 
 class TagForm(SlugCleanMixin, forms.ModelForm):
+    reserved_slugs = ('create', 'facets')
+
     # inherit all the Tag's model fields
     class Meta:
         model = Tag
@@ -0,0 +1,94 @@
+import logging
+import random
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from product.facets import get_index, invalidate_facets
+from product.models import Product, Tag
+
+
+class Command(BaseCommand):
+    help = 'Compare the "products having all of these tags" queries in SQL and in the facets index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200000,
+                            help='Number of products to seed.')
+        parser.add_argument('--tags', type=int, default=5000,
+                            help='Number of tags to seed: the Nth tag is N times less popular than the first.')
+        parser.add_argument('--tags-per-product', type=int, default=5,
+                            help='Number of tags drawn for every product.')
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Number of intersections timed for every selection.')
+
+    def handle(self, *args, **options):
+        logging.disable(logging.CRITICAL)
+        # everything happens in a throwaway test database: the real one is never touched
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            tags = self.seed(options['products'], options['tags'], options['tags_per_product'])
+            self.run(tags, options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, products, tags, tags_per_product, batch_size=10000):
+        self.stdout.write('Seeding {} products and {} tags...'.format(products, tags))
+        Tag.objects.bulk_create(Tag(name='tag {}'.format(i), slug='tag-{}'.format(i)) for i in range(tags))
+        tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        Through = Product.tags.through
+        rng = random.Random(0)
+        # a long tail of tags, as in a real catalogue: most of them are carried by a few products
+        cum_weights = list(accumulate(1 / (n + 1) for n in range(len(tag_ids))))
+        for start in range(0, products, batch_size):
+            stop = min(start + batch_size, products)
+            Product.objects.bulk_create(
+                Product(name='product {}'.format(i), slug='product-{}'.format(i)) for i in range(start, stop))
+            product_ids = Product.objects.filter(id__gt=start).order_by('id').values_list('id', flat=True)
+            Through.objects.bulk_create(
+                Through(product_id=product_id, tag_id=tag_id)
+                for product_id in product_ids
+                for tag_id in set(rng.choices(tag_ids, cum_weights=cum_weights, k=tags_per_product)))
+        # bulk_create sends no signal
+        Tag.objects.recount()
+        invalidate_facets()
+        return tag_ids
+
+    def time(self, function, how_many):
+        function()  # warm up
+        start = time.perf_counter()
+        for _ in range(how_many):
+            result = function()
+        return (time.perf_counter() - start) / how_many * 1000, result
+
+    def run(self, tag_ids, how_many):
+        start = time.perf_counter()
+        index = get_index()
+        self.stdout.write('Index built in {:.0f} ms'.format((time.perf_counter() - start) * 1000))
+        middle = tag_ids[len(tag_ids) // 2]
+        selections = [tag_ids[:1], tag_ids[:2], tag_ids[:3], [middle], [tag_ids[0], middle]]
+        for selection in selections:
+
+            def sql():
+                queryset = Product.objects.all()
+                for tag_id in selection:
+                    queryset = queryset.filter(tags=tag_id)
+                return queryset.count(), list(queryset.order_by('id').values_list('id', flat=True)[:10])
+
+            def facets():
+                result = index.match('product', selection)
+                return len(result), result[:10]
+
+            def refinements():
+                return index.refinements('product', index.match('product', selection))
+
+            sql_time, sql_result = self.time(sql, how_many)
+            facets_time, facets_result = self.time(facets, how_many)
+            refinements_time, counts = self.time(refinements, how_many)
+            if sql_result != facets_result:
+                self.stderr.write('The results differ: {} and {}'.format(sql_result, facets_result))
+            self.stdout.write('tags {:<22} {:>7} matches   SQL: {:8.2f} ms   facets: {:8.3f} ms   '
+                              'refinements ({} tags): {:8.3f} ms'.format(
+                                  str(selection), facets_result[0], sql_time, facets_time,
+                                  len(counts), refinements_time))
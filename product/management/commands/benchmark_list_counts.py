@@ -0,0 +1,77 @@
+import logging
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import RequestFactory
+
+from blog.models import Post, PostArchive
+from blog.views import PostList
+from product.models import Tag
+from product.utils import CachedCountPaginator
+from product.views import TagList
+
+
+class Command(BaseCommand):
+    help = 'Compare the latency of the paginated list pages with and without the cached counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000,
+                            help='Number of tags and of blog posts to seed.')
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Number of requests timed for every page.')
+
+    def handle(self, *args, **options):
+        # the DEBUG "django" logger would spend more time printing the queries than running them
+        logging.disable(logging.CRITICAL)
+        # everything happens in a throwaway test database: the real one is never touched
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed(options['rows'])
+            self.run(options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, rows, batch_size=10000):
+        self.stdout.write('Seeding {} tags and {} posts...'.format(rows, rows))
+        for start in range(0, rows, batch_size):
+            stop = min(start + batch_size, rows)
+            Tag.objects.bulk_create(
+                Tag(name='tag {}'.format(i), slug='tag-{}'.format(i)) for i in range(start, stop))
+            Post.objects.bulk_create(
+                Post(title='post {}'.format(i), slug='post-{}'.format(i), text='text') for i in range(start, stop))
+        # bulk_create sends no signal
+        PostArchive.objects.rebuild()
+
+    def time_page(self, view, path, how_many):
+        factory = RequestFactory()
+
+        def get():
+            request = factory.get(path)
+            request.user = AnonymousUser()
+            view(request).render()
+
+        get()  # warm up (and, for the cached paginator, fill the cache)
+        start = time.perf_counter()
+        for _ in range(how_many):
+            get()
+        return (time.perf_counter() - start) / how_many * 1000
+
+    def run(self, how_many):
+        cache.clear()
+        pages = (
+            ('PostList', PostList, {}, '/blog/'),
+            ('PostList', PostList, {}, '/blog/?page=50'),
+            ('TagList', TagList, {'keyset_ordering': None}, '/tag/'),
+            ('TagList', TagList, {'keyset_ordering': None}, '/tag/?page=50'),
+        )
+        for name, view_class, initkwargs, path in pages:
+            timings = []
+            for paginator_class in (Paginator, CachedCountPaginator):
+                view = view_class.as_view(paginator_class=paginator_class, **initkwargs)
+                timings.append(self.time_page(view, path, how_many))
+            self.stdout.write('{:<10} {:<16} Paginator: {:8.2f} ms   CachedCountPaginator: {:8.2f} ms'.format(
+                name, path, *timings))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from product.catalogue import FORMATS, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Export tags, products and links to a CSV or JSON lines file (see product.catalogue).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='The file to write (default: standard output).')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Format of the file (default: guessed from its extension).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path and path.endswith('.csv') else 'jsonl')
+        if path is None:
+            write_rows(self.stdout, format, export_rows())
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                write_rows(stream, format, export_rows())
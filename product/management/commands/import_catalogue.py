@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from product.catalogue import FORMATS, CatalogueImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import tags, products and links from a CSV or JSON lines file (see product.catalogue).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The file to import.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Format of the file (default: guessed from its extension).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows written by every bulk insert.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        importer = CatalogueImporter(batch_size=options['batch_size'])
+        try:
+            with open(path, newline='', encoding='utf-8') as stream, transaction.atomic():
+                # the CSV header is line 1
+                first_line = 2 if format == 'csv' else 1
+                for line, row in enumerate(read_rows(stream, format), start=first_line):
+                    importer.add(line, row)
+                importer.finish()
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        for message in importer.errors:
+            self.stderr.write(message)
+        self.stdout.write('Imported {tag} tags, {product} products and {link} links.'.format(**importer.created))
+        if importer.errors:
+            self.stdout.write('{} rows were skipped.'.format(len(importer.errors)))
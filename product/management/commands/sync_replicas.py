@@ -0,0 +1,34 @@
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.replicas import PRIMARY, stamp_replicas_sync
+
+
+class Command(BaseCommand):
+    help = 'Refresh the local SQLite replicas (see core.replicas) with a copy of the primary database.'
+
+    def handle(self, *args, **options):
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Only SQLite replicas are copied by this command: '
+                               'replicate the other databases with the tools of the database.')
+        source = primary.settings_dict['NAME']
+        with primary.cursor() as cursor:
+            # keep the writers out while the file is copied
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                for alias in settings.DATABASE_REPLICAS:
+                    target = connections[alias].settings_dict['NAME']
+                    connections[alias].close()
+                    # the readers of the replica see either the old copy or the new one, never half of it
+                    shutil.copyfile(source, target + '.tmp')
+                    os.replace(target + '.tmp', target)
+                    self.stdout.write('{} copied to {}'.format(source, alias))
+            finally:
+                cursor.execute('ROLLBACK')
+        # only now may the pages cached from the old copies be replaced
+        stamp_replicas_sync()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 18:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_tagged(apps, schema_editor):
+    # the historical models know nothing of TagQuerySet.recount: count the same way here
+    counts = {}
+    for field, through in (('product_count', apps.get_model('product', 'Product').tags.through),
+                           ('post_count', apps.get_model('blog', 'Post').tags.through)):
+        rows = (through.objects
+                .filter(tag_id=OuterRef('pk'))
+                .order_by()
+                .values('tag_id')
+                .annotate(count=Count('pk'))
+                .values('count'))
+        counts[field] = Coalesce(Subquery(rows, output_field=models.IntegerField()), 0)
+    apps.get_model('product', 'Tag').objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_auto_20261018_1806'),
+        ('blog', '0003_post_slug_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_tagged, migrations.RunPython.noop),
+    ]
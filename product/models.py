@@ -1,6 +1,18 @@
-from django.core.urlresolvers import reverse
-
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.urlbuilders import URLBuilder
+
+# the URLs of the catalogue are built for every row of the list pages: see core.urlbuilders
+product_detail_url = URLBuilder('product_product_detail')
+product_update_url = URLBuilder('product_product_update')
+product_delete_url = URLBuilder('product_product_delete')
+tag_detail_url = URLBuilder('product_tag_detail')
+tag_update_url = URLBuilder('product_tag_update')
+tag_delete_url = URLBuilder('product_tag_delete')
+link_update_url = URLBuilder('product_link_update')
+link_delete_url = URLBuilder('product_link_delete')
 
 
 class Product(models.Model):
@@ -11,33 +23,63 @@ class Product(models.Model):
     tags = models.ManyToManyField('Tag')
 
     def get_absolute_url(self):
-        return reverse('product_product_detail', kwargs={'slug': self.slug})
+        return product_detail_url(slug=self.slug)
 
     def get_update_url(self):
-        return reverse('product_product_update', kwargs={'slug': self.slug})
+        return product_update_url(slug=self.slug)
 
     def get_delete_url(self):
-        return reverse('product_product_update', kwargs={'slug': self.slug})
+        return product_delete_url(slug=self.slug)
 
     def __str__(self):
         return self.name
 
     class Meta:
         get_latest_by = 'added_to_catalogue'
+        # backs the keyset pagination of the product list
+        indexes = [models.Index(fields=['added_to_catalogue', 'id'])]
+
+
+class TagQuerySet(models.QuerySet):
+    def recount(self):
+        """Count again the products and the posts of the tags, i.e. after their relations were
+        written with bulk_create, which sends no m2m_changed signal."""
+        counts = {}
+        for field, accessor in (('product_count', 'product_set'), ('post_count', 'post_set')):
+            through = getattr(self.model, accessor).rel.through
+            rows = (through.objects
+                    .filter(tag_id=OuterRef('pk'))
+                    .order_by()
+                    .values('tag_id')
+                    .annotate(count=Count('pk'))
+                    .values('count'))
+            counts[field] = Coalesce(Subquery(rows, output_field=models.IntegerField()), 0)
+        return self.update(**counts)
+
+
+class FacetGeneration(models.Model):
+    """The generation of the facets index (see product.facets): a single row, bumped once every
+    change to the tags of the products and the posts commits."""
+    generation = models.BigIntegerField()
 
 
 class Tag(models.Model):
     name = models.CharField(max_length=31, unique=True)
     slug = models.SlugField(max_length=31, unique=True, help_text='A label identifying the tag URL')
+    # the number of products and posts of the tag, kept by the receivers in product.signals
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TagQuerySet.as_manager()
 
     def get_absolute_url(self):
-        return reverse('product_tag_detail', kwargs={'slug': self.slug})
+        return tag_detail_url(slug=self.slug)
 
     def get_update_url(self):
-        return reverse('product_tag_update', kwargs={'slug': self.slug})
+        return tag_update_url(slug=self.slug)
 
     def get_delete_url(self):
-        return reverse('product_tag_delete', kwargs={'slug': self.slug})
+        return tag_delete_url(slug=self.slug)
 
     def __str__(self):
         return self.name
@@ -47,24 +89,61 @@ class Tag(models.Model):
         ordering = ['name']
 
 
+class LinkManager(models.Manager):
+
+    # give the links the slugs of their products, looked up in one query per batch of links
+    # (keep it below 999, the limit of SQLite to the query parameters) instead of one product per link
+    def attach_product_slugs(self, links, batch_size=500):
+        missing = sorted({link.product_id for link in links if link.get_loaded_product_slug() is None})
+        slugs = {}
+        for start in range(0, len(missing), batch_size):
+            slugs.update(Product.objects
+                         .filter(pk__in=missing[start:start + batch_size])
+                         .values_list('pk', 'slug'))
+        for link in links:
+            if link.product_id in slugs:
+                # the slug goes with the product it was looked up for, not with the link
+                link._product_slug = (link.product_id, slugs[link.product_id])
+        return links
+
+
 class Link(models.Model):
     title = models.CharField(max_length=63)
     publication_date = models.DateField(verbose_name='date published')
     link_url = models.URLField()
     product = models.ForeignKey('Product')
 
-    # notice the get_absolute_url() here just calls the equivalent method of the product
-    # referred by its link(s)
+    objects = LinkManager()
+
+    # the slug of the product, if the product was loaded together with the link, or attached to
+    # the link by LinkManager.attach_product_slugs
+    def get_loaded_product_slug(self):
+        product = self.__dict__.get(self._meta.get_field('product').get_cache_name())
+        if product is not None and product.pk == self.product_id:
+            return product.slug
+        product_id, slug = self.__dict__.get('_product_slug', (None, None))
+        if product_id is not None and product_id == self.product_id:
+            return slug
+        return None
+
+    # notice the get_absolute_url() here points to the page of the product referred by the link:
+    # only the slug of the product is needed to build it, not the whole product
     def get_absolute_url(self):
-        return self.product.get_absolute_url()
+        if self.get_loaded_product_slug() is None:
+            Link.objects.attach_product_slugs([self])
+        slug = self.get_loaded_product_slug()
+        if slug is None:
+            # like self.product would
+            raise Link.product.RelatedObjectDoesNotExist('Link has no product.')
+        return product_detail_url(slug=slug)
 
     # notice the reversed update url for each link is identified unequivocally by its id on the
     # database
     def get_update_url(self):
-        return reverse('product_link_update', kwargs={'pk': self.pk})
+        return link_update_url(pk=self.pk)
 
     def get_delete_url(self):
-        return reverse('product_link_delete', kwargs={'pk': self.pk})
+        return link_delete_url(pk=self.pk)
 
     def __str__(self):
         return '{}:{}'.format(self.product, self.title)
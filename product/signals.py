@@ -0,0 +1,69 @@
+# Receivers bumping the versions of the objects whose pages are cached (see core.cache): they are
+# connected to the signals of the catalogue models by ProductConfig.ready.
+# Each page also shows some of the related objects, so the versions of those are bumped as well.
+# The receivers are connected to pre_delete too, while the related rows still exist; a brand new
+# object, on the other hand, has nothing related yet.
+from django.db.models import F
+
+from core.cache import bump_object_versions
+
+
+def product_changed(sender, instance, **kwargs):
+    bump_object_versions(sender, [instance.pk])
+    if kwargs.get('created'):
+        return
+    bump_object_versions(instance.tags.model, instance.tags.values_list('pk', flat=True))
+    bump_object_versions(instance.post_set.model, instance.post_set.values_list('pk', flat=True))
+
+
+def tag_changed(sender, instance, **kwargs):
+    bump_object_versions(sender, [instance.pk])
+    if kwargs.get('created'):
+        return
+    bump_object_versions(instance.product_set.model, instance.product_set.values_list('pk', flat=True))
+    bump_object_versions(instance.post_set.model, instance.post_set.values_list('pk', flat=True))
+
+
+def link_changed(sender, instance, **kwargs):
+    bump_object_versions(sender._meta.get_field('product').related_model, [instance.product_id])
+
+
+# The counters of the tags (Tag.product_count and Tag.post_count) follow the rows of the tags
+# tables of Product and Post, whichever side the rows are changed from. The rows removed or cleared
+# are looked up beforehand: pk_set holds whatever was asked for, existing rows or not.
+def tagged_fields(sender):
+    relations = [field for field in sender._meta.fields if field.is_relation]
+    tag = next(field for field in relations if field.name == 'tag')
+    tagged = next(field for field in relations if field is not tag)
+    return tag, tagged
+
+
+def count_tagged(sender, instance, action, reverse, model, pk_set, **kwargs):
+    tag, tagged = tagged_fields(sender)
+    source, target = (tag, tagged) if reverse else (tagged, tag)
+    if action in ('pre_remove', 'pre_clear'):
+        rows = sender.objects.filter(**{source.attname: instance.pk})
+        if action == 'pre_remove':
+            rows = rows.filter(**{target.attname + '__in': pk_set})
+        instance._untagged_pks = set(rows.values_list(target.attname, flat=True))
+        return
+    if action == 'post_add':
+        pks, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        pks, delta = instance.__dict__.pop('_untagged_pks', ()), -1
+    else:
+        return
+    if not pks:
+        return
+    counter = '{}_count'.format(tagged.related_model._meta.model_name)
+    if reverse:
+        tag.related_model.objects.filter(pk=instance.pk).update(**{counter: F(counter) + delta * len(pks)})
+        setattr(instance, counter, getattr(instance, counter) + delta * len(pks))
+    else:
+        tag.related_model.objects.filter(pk__in=pks).update(**{counter: F(counter) + delta})
+
+
+def uncount_tagged(sender, instance, **kwargs):
+    """pre_delete receiver of Product and Post: their tags rows are about to be deleted."""
+    counter = '{}_count'.format(sender._meta.model_name)
+    instance.tags.model.objects.filter(pk__in=instance.tags.values('pk')).update(**{counter: F(counter) - 1})
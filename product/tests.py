@@ -1 +1,606 @@
-# Create your tests here.
+import os
+import tempfile
+from array import array
+from datetime import date
+from io import StringIO
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from blog.models import Post
+from core.queries import QueryBudgetExceeded, QueryCounter, query_budget, sql_shape
+from core.replicas import PIN_COOKIE, stamp_replicas_sync
+from search.backends import get_backend
+from .facets import FacetIndex, FacetResult, get_index, invalidate_facets, iter_bits, popcount, to_bitmap
+from .models import FacetGeneration, Link, Product, Tag
+from .utils import KeysetPaginator, cached_count
+
+
+class ProductDetailQueryTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Widget', slug='widget')
+
+    def add_related(self, how_many):
+        offset = self.product.tags.count()
+        for i in range(offset, offset + how_many):
+            tag = Tag.objects.create(name='tag {}'.format(i), slug='tag-{}'.format(i))
+            self.product.tags.add(tag)
+            Link.objects.create(title='link {}'.format(i), publication_date=date.today(),
+                                link_url='http://example.org/{}'.format(i), product=self.product)
+            post = Post.objects.create(title='post {}'.format(i), slug='post-{}'.format(i), text='text')
+            post.products.add(self.product)
+
+    def test_query_count_is_constant(self):
+        # the lookup of the page validators, one query for the product, plus one for each
+        # prefetched relation
+        url = self.product.get_absolute_url()
+        for how_many in (1, 10):
+            self.add_related(how_many)
+            with self.assertNumQueries(5):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+
+class TagCounterTests(TestCase):
+
+    def setUp(self):
+        self.tag = Tag.objects.create(name='tools', slug='tools')
+        self.products = [Product.objects.create(name='product {}'.format(i), slug='product-{}'.format(i))
+                         for i in range(3)]
+        self.post = Post.objects.create(title='post', slug='post', text='text')
+
+    def assertCounts(self, products, posts):
+        tag = Tag.objects.get(pk=self.tag.pk)
+        self.assertEqual((tag.product_count, tag.post_count), (products, posts))
+
+    def test_counters_follow_both_sides(self):
+        self.products[0].tags.add(self.tag)
+        self.products[0].tags.add(self.tag)
+        self.tag.product_set.add(*self.products[1:])
+        self.post.tags.add(self.tag)
+        self.assertCounts(3, 1)
+        self.tag.product_set.remove(self.products[0], self.products[0])
+        self.products[1].tags.remove(self.tag)
+        self.products[1].tags.remove(self.tag)
+        self.assertCounts(1, 1)
+        self.tag.product_set.clear()
+        self.post.tags.clear()
+        self.assertCounts(0, 0)
+
+    def test_counters_follow_deletions(self):
+        self.tag.product_set.add(*self.products)
+        self.post.tags.add(self.tag)
+        self.products[0].delete()
+        self.post.delete()
+        self.assertCounts(2, 0)
+
+    def test_recount(self):
+        self.tag.product_set.add(*self.products)
+        Tag.objects.update(product_count=0, post_count=7)
+        Tag.objects.recount()
+        self.assertCounts(3, 0)
+
+
+class TagDetailQueryTests(TestCase):
+
+    def setUp(self):
+        self.tag = Tag.objects.create(name='tools', slug='tools')
+        self.url = self.tag.get_absolute_url()
+
+    def add_related(self, how_many):
+        offset = self.tag.product_count
+        for i in range(offset, offset + how_many):
+            self.tag.product_set.add(Product.objects.create(name='product {:02}'.format(i),
+                                                            slug='product-{}'.format(i)))
+            post = Post.objects.create(title='post {}'.format(i), slug='post-{}'.format(i), text='text')
+            post.tags.add(self.tag)
+
+    def test_query_count_is_constant(self):
+        # the lookup of the page validators, one query for the tag and one for each page
+        # of its products and posts
+        for how_many in (1, 30):
+            self.add_related(how_many)
+            with self.assertNumQueries(4):
+                response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_related_pages(self):
+        self.add_related(12)
+        response = self.client.get(self.url, {'products': 2, 'posts': 1})
+        self.assertContains(response, 'This Tag is associated with 12')
+        self.assertContains(response, 'product 10')
+        self.assertNotContains(response, 'product 09')
+        self.assertContains(response, 'href="?products=1&amp;posts=1"')
+        self.assertContains(response, 'href="?products=2&amp;posts=2"')
+        self.assertEqual(self.client.get(self.url, {'products': 3}).status_code, 404)
+
+
+# the index follows the committed changes only
+class FacetTests(TransactionTestCase):
+
+    def setUp(self):
+        # the index outlives the databases flushed by the other tests
+        invalidate_facets()
+        self.tools, self.toys, self.spare = [Tag.objects.create(name=name, slug=name)
+                                             for name in ('tools', 'toys', 'spare')]
+        self.products = [Product.objects.create(name='product {}'.format(i), slug='product-{}'.format(i))
+                         for i in range(4)]
+        self.tools.product_set.add(*self.products)
+        self.toys.product_set.add(*self.products[:2])
+        self.products[1].tags.add(self.spare)
+
+    def match(self, *tags, kind='product'):
+        return list(get_index().match(kind, [tag.pk for tag in tags])[:])
+
+    def test_bitmaps(self):
+        bitmap = to_bitmap([3, 700, 9, 0])
+        self.assertEqual(list(iter_bits(bitmap)), [0, 3, 9, 700])
+        self.assertEqual(popcount(bitmap), 4)
+        self.assertEqual(FacetResult(bitmap)[1:3], [3, 9])
+
+    def test_small_postings_are_arrays(self):
+        index = FacetIndex(0)
+        index.add('product', 1, range(1, 201))
+        index.add('product', 2, [7, 150, 5000])
+        index.add('product', 3, [150])
+        self.assertIsInstance(index.postings['product'][1], int)
+        self.assertIsInstance(index.postings['product'][2], array)
+        self.assertEqual(index.match('product', [1, 2])[:], [7, 150])
+        self.assertEqual(index.match('product', [2, 1, 3])[:], [150])
+        self.assertEqual(index.refinements('product', index.match('product', [2])), {1: 2, 2: 3, 3: 1})
+        self.assertEqual(index.refinements('product', index.match('product', [1])), {1: 200, 2: 2, 3: 1})
+        # the bitmap thinned out turns into an array, and the objects deleted leave every posting
+        index.remove('product', 1, set(range(1, 201)) - {1, 150})
+        self.assertEqual(index.postings['product'][1], array('q', [1, 150]))
+        index.discard_object('product', 150)
+        self.assertEqual(index.match('product', [2])[:], [7, 5000])
+        self.assertNotIn(3, index.postings['product'])
+        index.discard_tag(2)
+        self.assertEqual(index.tags['product'], {1: array('q', [1])})
+
+    def test_intersections_follow_the_changes(self):
+        pks = [product.pk for product in self.products]
+        self.assertEqual(self.match(self.tools, self.toys), pks[:2])
+        # the index is not built again for every change: only its generation is read
+        with self.assertNumQueries(1):
+            self.assertEqual(self.match(self.tools, self.toys, self.spare), pks[1:2])
+        self.products[0].tags.remove(self.toys)
+        self.toys.product_set.add(self.products[3])
+        self.assertEqual(self.match(self.tools, self.toys), [pks[1], pks[3]])
+        self.products[1].tags.clear()
+        self.products[3].delete()
+        self.assertEqual(self.match(self.toys), [])
+        self.spare.delete()
+        self.assertNotIn(self.spare.pk, get_index().postings['product'])
+        post = Post.objects.create(title='post', slug='post', text='text')
+        post.tags.add(self.toys)
+        self.assertEqual(self.match(self.toys, kind='post'), [post.pk])
+
+    def test_changes_leave_the_index_being_read_alone(self):
+        pks = [product.pk for product in self.products]
+        index = get_index()
+        self.products[0].tags.remove(self.toys)
+        self.products[2].delete()
+        # another thread still reading the index sees it whole, the next readers see the changes
+        self.assertEqual(index.match('product', [self.tools.pk, self.toys.pk])[:], pks[:2])
+        self.assertEqual(index.refinements('product', index.match('product', [self.tools.pk]))[self.tools.pk], 4)
+        self.assertEqual(self.match(self.tools, self.toys), pks[1:2])
+        self.assertEqual(self.match(self.tools), [pks[0], pks[1], pks[3]])
+
+    def test_rolled_back_changes_are_not_indexed(self):
+        pks = [product.pk for product in self.products]
+        index = get_index()
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                self.toys.product_set.add(*self.products[2:])
+                Tag.objects.create(name='tools', slug='tools')
+        self.assertIs(get_index(), index)
+        self.assertEqual(self.match(self.tools, self.toys), pks[:2])
+
+    def test_changes_elsewhere_rebuild_the_index(self):
+        index = get_index()
+        # i.e. another process, or a bulk_create
+        Product.tags.through.objects.filter(tag=self.toys).delete()
+        invalidate_facets()
+        self.assertIsNot(get_index(), index)
+        self.assertEqual(self.match(self.toys), [])
+
+    def test_changes_of_other_processes_rebuild_the_index(self):
+        index = get_index()
+        # what another process (i.e.: import_catalogue) leaves behind: new rows, and a new generation
+        Product.tags.through.objects.filter(tag=self.toys).delete()
+        FacetGeneration.objects.update(generation=F('generation') + 1)
+        self.assertIsNot(get_index(), index)
+        self.assertEqual(self.match(self.toys), [])
+
+    def test_facets_page(self):
+        url = reverse('product_tag_facets')
+        response = self.client.get(url)
+        self.assertEqual([(tag.name, tag.facet_count) for tag in response.context['cloud']],
+                         [('tools', 4), ('toys', 2), ('spare', 1)])
+        response = self.client.get(url, {'tag': ['tools', 'toys']})
+        self.assertEqual(response.context['object_list'], self.products[:2])
+        self.assertEqual([(tag.name, tag.facet_count) for tag in response.context['cloud']], [('spare', 1)])
+        self.assertContains(response, 'href="?tag=tools&amp;tag=toys&amp;tag=spare"')
+        self.assertEqual(self.client.get(url, {'tag': 'missing'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'tag': 'tools', 'page': 9}).status_code, 404)
+
+
+class URLTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Widget', slug='widget')
+        self.links = [Link.objects.create(title='link {}'.format(i), publication_date=date.today(),
+                                          link_url='http://example.org/', product=self.product)
+                      for i in range(3)]
+
+    def test_same_urls_as_reverse(self):
+        tag = Tag.objects.create(name='tools', slug='tools')
+        for obj, prefix in ((self.product, 'product_product'), (tag, 'product_tag')):
+            self.assertEqual(obj.get_absolute_url(), reverse(prefix + '_detail', kwargs={'slug': obj.slug}))
+            self.assertEqual(obj.get_update_url(), reverse(prefix + '_update', kwargs={'slug': obj.slug}))
+            self.assertEqual(obj.get_delete_url(), reverse(prefix + '_delete', kwargs={'slug': obj.slug}))
+        link = self.links[0]
+        self.assertEqual(link.get_update_url(), reverse('product_link_update', kwargs={'pk': link.pk}))
+        self.assertEqual(link.get_delete_url(), reverse('product_link_delete', kwargs={'pk': link.pk}))
+
+    def test_link_urls_need_no_product(self):
+        links = list(Link.objects.all())
+        with self.assertNumQueries(1):
+            Link.objects.attach_product_slugs(links)
+        with self.assertNumQueries(0):
+            self.assertEqual({link.get_absolute_url() for link in links}, {self.product.get_absolute_url()})
+        # a product loaded with the link is used as it is
+        link = Link.objects.select_related('product').first()
+        with self.assertNumQueries(0):
+            self.assertEqual(link.get_absolute_url(), self.product.get_absolute_url())
+        # otherwise, only the slug is looked up
+        link = Link.objects.first()
+        with self.assertNumQueries(1):
+            link.get_absolute_url()
+            link.get_absolute_url()
+
+    def test_link_urls_follow_the_product(self):
+        other = Product.objects.create(name='Gadget', slug='gadget')
+        links = Link.objects.attach_product_slugs(list(Link.objects.all()))
+        links[0].product_id = other.pk
+        self.assertEqual(links[0].get_absolute_url(), other.get_absolute_url())
+        links[1].product = other
+        self.assertEqual(links[1].get_absolute_url(), other.get_absolute_url())
+        links[2].product_id = other.pk + 1
+        with self.assertRaises(Product.DoesNotExist):
+            links[2].get_absolute_url()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTests(TransactionTestCase):
+    multi_db = True
+
+    def setUp(self):
+        cache.clear()
+        # the replicas lag behind the primary: they hold an older name of the product
+        Product.objects.create(name='Widget', slug='widget')
+        for alias in ('replica1', 'replica2'):
+            Product.objects.using(alias).create(name='Old Widget', slug='widget')
+        self.url = reverse('product_product_detail', kwargs={'slug': 'widget'})
+
+    def test_list_and_detail_pages_read_from_a_replica(self):
+        self.assertContains(self.client.get(self.url), 'Old Widget')
+        self.assertContains(self.client.get(reverse('product_product_update', kwargs={'slug': 'widget'})),
+                            'value="Widget"')
+        self.assertEqual(Product.objects.get().name, 'Widget')
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        # the page of the product is cached from a replica first
+        self.assertContains(self.client.get(self.url), 'Old Widget')
+        response = self.client.post(reverse('product_tag_create'), {'name': 'tools', 'slug': 'tools'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertFalse(Tag.objects.using('replica1').exists())
+        # the new tag is only on the primary
+        tag_url = reverse('product_tag_detail', kwargs={'slug': 'tools'})
+        self.assertEqual(self.client.get(tag_url).status_code, 200)
+        self.assertContains(self.client.get(self.url), '<h2>Widget</h2>')
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.client.get(tag_url).status_code, 404)
+
+    def test_pages_read_from_a_replica_follow_its_syncs(self):
+        product = Product.objects.get()
+        product.name = 'New Widget'
+        product.save()
+        # the versions were bumped on the primary, but the replicas still hold the old name
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Old Widget')
+        # what sync_replicas does
+        Product.objects.using('replica1').update(name='New Widget')
+        Product.objects.using('replica2').update(name='New Widget')
+        stamp_replicas_sync()
+        synced = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'],
+                                 HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertContains(synced, 'New Widget')
+        self.assertNotEqual(synced['ETag'], response['ETag'])
+
+    def test_queries_on_the_replicas_count_against_the_budget(self):
+        @query_budget(1)
+        def view(request):
+            Tag.objects.using('replica1').count()
+            Tag.objects.using('replica2').count()
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            view(RequestFactory().get('/'))
+
+    def test_page_read_from_a_replica_keeps_its_budget(self):
+        with QueryCounter() as counter:
+            self.assertContains(self.client.get(self.url), 'Old Widget')
+        self.assertTrue(any(capture.connection.alias.startswith('replica') and len(capture)
+                            for capture in counter.captures))
+
+
+class QueryBudgetTests(TestCase):
+
+    def test_repeated_queries_share_a_shape(self):
+        self.assertEqual(
+            sql_shape("SELECT * FROM product_tag WHERE id = 12 AND name = 'it''s'"),
+            sql_shape("SELECT * FROM product_tag WHERE id = 7 AND name = 'other'"))
+
+    def test_view_over_budget_fails(self):
+        @query_budget(1)
+        def view(request):
+            Tag.objects.count()
+            Tag.objects.count()
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            view(RequestFactory().get('/'))
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        for i in range(12):
+            Tag.objects.create(name='tag {:02}'.format(i), slug='tag-{}'.format(i))
+        self.paginator = KeysetPaginator(Tag.objects.all(), 5, ('name', 'id'))
+        self.expected = list(Tag.objects.order_by('name', 'id'))
+
+    def test_walk_forward(self):
+        page, seen = self.paginator.page(), []
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = self.paginator.page(self.paginator.cursor('after', page[len(page) - 1], page.position + 1))
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(page.number, 3)
+
+    def test_walk_backwards_from_last_page(self):
+        page, seen = self.paginator.page(self.paginator.cursor('last', number=-1)), []
+        while True:
+            seen[:0] = list(page)
+            if not page.has_previous():
+                break
+            page = self.paginator.page(self.paginator.cursor('before', page[0], page.position - 1))
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(page.number, 1)
+
+    def test_list_view_does_not_count(self):
+        Product.objects.create(name='Widget', slug='widget')
+        with self.assertNumQueries(1):
+            response = self.client.get('/tag/')
+        self.assertEqual(len(response.context['tag_list']), 5)
+        next_page = self.client.get('/tag/' + response.context['next_page_url'])
+        self.assertEqual(next_page.context['page_obj'].number, 2)
+        self.assertEqual(self.client.get('/tag/?cursor=forged').status_code, 404)
+
+    def test_stale_cursors_give_empty_pages(self):
+        # i.e.: the rows the cursors were made from have been deleted since
+        for cursor in (self.paginator.cursor('after', self.expected[-1], 4),
+                       self.paginator.cursor('before', self.expected[0], 0)):
+            response = self.client.get('/tag/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['tag_list']), 0)
+            self.assertIsNone(response.context['previous_page_url'])
+            self.assertIsNone(response.context['next_page_url'])
+
+
+class CachedCountTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            Tag.objects.create(name='tag {}'.format(i), slug='tag-{}'.format(i))
+
+    def test_count_is_cached_until_a_change(self):
+        self.assertEqual(cached_count(Tag.objects.all()), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(Tag.objects.all()), 3)
+        Tag.objects.create(name='tag 3', slug='tag-3')
+        self.assertEqual(cached_count(Tag.objects.all()), 4)
+        Tag.objects.get(slug='tag-0').delete()
+        self.assertEqual(cached_count(Tag.objects.all()), 3)
+
+    def test_filtered_counts_are_cached_apart(self):
+        self.assertEqual(cached_count(Tag.objects.filter(slug='tag-1')), 1)
+        self.assertEqual(cached_count(Tag.objects.all()), 3)
+
+    def test_counts_follow_the_related_models(self):
+        product = Product.objects.create(name='Widget', slug='widget')
+        tag = Tag.objects.get(slug='tag-0')
+        self.assertEqual(cached_count(Product.objects.filter(tags=tag)), 0)
+        self.assertEqual(cached_count(tag.product_set.all()), 0)
+        self.assertEqual(cached_count(Tag.objects.filter(product__name='Widget')), 0)
+        product.tags.add(tag)
+        self.assertEqual(cached_count(Product.objects.filter(tags=tag)), 1)
+        self.assertEqual(cached_count(tag.product_set.all()), 1)
+        self.assertEqual(cached_count(Tag.objects.filter(product__name='Widget')), 1)
+        tag.product_set.clear()
+        self.assertEqual(cached_count(Product.objects.filter(tags=tag)), 0)
+        product.tags.add(tag)
+        product.name = 'Gadget'
+        product.save()
+        self.assertEqual(cached_count(Tag.objects.filter(product__name='Widget')), 0)
+
+    @override_settings(APPROXIMATE_COUNT_THRESHOLD=2)
+    def test_big_tables_are_estimated(self):
+        # the estimate ignores the gap left by the deleted row
+        Tag.objects.get(slug='tag-1').delete()
+        self.assertEqual(cached_count(Tag.objects.all()), 3)
+        self.assertEqual(cached_count(Tag.objects.filter(slug__startswith='tag')), 2)
+
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Widget', slug='widget')
+        self.tag = Tag.objects.create(name='gadget', slug='gadget')
+        self.url = self.product.get_absolute_url()
+
+    def assertPageContains(self, text, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(self.url)
+        self.assertContains(response, text)
+
+    def test_cached_page_expires_on_changes(self):
+        self.assertPageContains('Widget', 5)
+        # cached: only the page validators are looked up
+        self.assertPageContains('Widget', 1)
+        self.product.tags.add(self.tag)
+        self.assertPageContains('Gadget', 5)
+        self.tag.name = 'gizmo'
+        self.tag.save()
+        self.assertPageContains('Gizmo', 5)
+        Link.objects.create(title='review', publication_date=date.today(),
+                            link_url='http://example.org/', product=self.product)
+        self.assertPageContains('Review', 5)
+        self.product.tags.clear()
+        with self.assertNumQueries(5):
+            self.assertNotContains(self.client.get(self.url), 'Gizmo')
+
+    def test_fragment_outlives_the_page_cache(self):
+        with self.settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=None):
+            self.assertPageContains('Widget', 5)
+            # the validators and the product, but none of its relations
+            self.assertPageContains('Widget', 2)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Widget', slug='widget')
+        self.url = self.product.get_absolute_url()
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.product.description = 'new'
+        self.product.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_pages_change_with_their_model(self):
+        etag = self.client.get('/product/')['ETag']
+        self.assertEqual(self.client.get('/product/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Product.objects.create(name='Gizmo', slug='gizmo')
+        self.assertEqual(self.client.get('/product/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_object(self):
+        self.assertEqual(self.client.get('/product/missing/').status_code, 404)
+
+
+class AnonymousSessionTests(TestCase):
+
+    def setUp(self):
+        tag = Tag.objects.create(name='garden', slug='garden')
+        product = Product.objects.create(name='Widget', slug='widget')
+        product.tags.add(tag)
+        Post.objects.create(title='News', slug='news', text='text', publication_date=date(2017, 1, 1))
+        self.urls = ['/product/', '/tag/', product.get_absolute_url(), tag.get_absolute_url(),
+                     reverse('blog_post_list')]
+
+    def browse(self):
+        with CaptureQueriesContext(connection) as queries:
+            for url in self.urls:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('sessionid', response.cookies)
+        return [query['sql'] for query in queries.captured_queries if 'django_session' in query['sql']]
+
+    def test_anonymous_browsing_does_no_session_query(self):
+        self.assertEqual(self.browse(), [])
+        self.assertFalse(Session.objects.exists())
+
+    def test_flash_messages_travel_in_a_cookie(self):
+        response = self.client.post(reverse('contact'), {
+            'email': 'user@example.org', 'text': 'Hi', 'contact_reason_selector': 'F'})
+        self.assertIn('messages', response.cookies)
+        self.assertFalse(Session.objects.exists())
+        # the message is shown on the next page, still without any session
+        self.assertEqual(self.browse(), [])
+        self.assertFalse(Session.objects.exists())
+
+
+class CatalogueCommandTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def import_file(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as stream:
+            stream.write(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_catalogue', path, batch_size=2, stdout=out, stderr=err)
+        return err.getvalue()
+
+    def test_import_csv(self):
+        errors = self.import_file('catalogue.csv', (
+            'type,name,slug,description,tags,title,publication_date,link_url,product\n'
+            'tag,Tools,tools,,,,,,\n'
+            'tag,Toys,toys,,,,,,\n'
+            'tag,Reserved,create,,,,,,\n'
+            'product,Hammer,Hammer,Heavy,tools toys,,,,\n'
+            'product,Saw,saw,,tools,,,,\n'
+            'product,Drill,drill,,missing,,,,\n'
+            'link,,,,,Review,2017-05-01,http://example.org/,hammer\n'
+            'link,,,,,Lost,2017-05-01,http://example.org/,drill\n'))
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)), ['tools', 'toys'])
+        self.assertEqual(sorted(Product.objects.get(slug='hammer').tags.values_list('slug', flat=True)),
+                         ['tools', 'toys'])
+        self.assertEqual(Link.objects.get().product.slug, 'hammer')
+        self.assertIn('line 4: slug', errors)
+        self.assertIn('line 7: unknown tags: missing', errors)
+        self.assertIn('line 9: unknown product "drill"', errors)
+        self.assertEqual(Tag.objects.get(slug='tools').product_count, 2)
+        # bulk_create skips the receivers of the search index: the importer indexes the rows itself
+        search = get_backend()
+        self.assertEqual(search.search('heavy', 0, 10), [('product', Product.objects.get(slug='hammer').pk)])
+        self.assertEqual(search.search('toys', 0, 10), [('tag', Tag.objects.get(slug='toys').pk)])
+
+    def test_export_then_import(self):
+        tag = Tag.objects.create(name='tools', slug='tools')
+        product = Product.objects.create(name='Hammer', slug='hammer')
+        product.tags.add(tag)
+        Link.objects.create(title='Review', publication_date=date(2017, 5, 1),
+                            link_url='http://example.org/', product=product)
+        out = StringIO()
+        call_command('export_catalogue', format='jsonl', stdout=out)
+        Product.objects.all().delete()
+        Tag.objects.all().delete()
+        self.assertEqual(self.import_file('catalogue.jsonl', out.getvalue()), '')
+        self.assertEqual(Link.objects.get().product.tags.get().slug, 'tools')
+
+    def test_export_csv(self):
+        product = Product.objects.create(name='Hammer', slug='hammer')
+        product.tags.add(Tag.objects.create(name='tools', slug='tools'), Tag.objects.create(name='toys', slug='toys'))
+        out = StringIO()
+        call_command('export_catalogue', format='csv', stdout=out)
+        self.assertIn('product,Hammer,hammer,,tools toys,', out.getvalue())
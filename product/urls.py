@@ -11,6 +11,7 @@ from .views import (LinkCreate,
                     TagCreate,
                     TagDelete,
                     TagDetail,
+                    TagFacets,
                     TagList,
                     TagUpdate)
 
@@ -24,9 +25,10 @@ urlpatterns = [
     url(r'^product/(?P<slug>[\w\-]+)/delete/$', ProductDelete.as_view(), name='product_product_delete'),
     url(r'^product/(?P<slug>[\w\-]+)/update/$', ProductUpdate.as_view(), name='product_product_update'),
     url(r'^tag/$', TagList.as_view(), name='product_tag_list'),
-    # the "tag/create" path must be matched BEFORE the pattern described by tag_detail view
+    # the "tag/create" and "tag/facets" paths must be matched BEFORE the pattern described by tag_detail view
     # otherwise we will always be sent to the wrong page
     url(r'^tag/create/$', TagCreate.as_view(), name='product_tag_create'),
+    url(r'^tag/facets/$', TagFacets.as_view(), name='product_tag_facets'),
     url(r'^tag/(?P<slug>[\w\-]+)/$', TagDetail.as_view(), name='product_tag_detail'),
     url(r'^tag/(?P<slug>[\w\-]+)/delete/$', TagDelete.as_view(), name='product_tag_delete'),
     url(r'^tag/(?P<slug>[\w\-]+)/update/$', TagUpdate.as_view(), name='product_tag_update'),
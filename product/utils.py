@@ -1,28 +1,254 @@
+import hashlib
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from core.cache import model_version
+from core.replicas import cache_variant
+
+
+def estimate_count(queryset):
+    """Cheap estimate of the number of rows of the (unfiltered) table behind the queryset."""
+    model = queryset.model
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [model._meta.db_table])
+        else:
+            # the primary key index answers this without reading the table
+            cursor.execute('SELECT MAX({pk}) - MIN({pk}) + 1 FROM {table}'.format(
+                pk=connection.ops.quote_name(model._meta.pk.column),
+                table=connection.ops.quote_name(model._meta.db_table)))
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return int(row[0])
+
+
+def counted_models(queryset):
+    """The models of the tables the query of the queryset reads (including the through models of
+    the many-to-many relations it filters on)."""
+    tables = {table.table_name for table in queryset.query.alias_map.values()}
+    models = {model for model in apps.get_models(include_auto_created=True) if model._meta.db_table in tables}
+    models.add(queryset.model)
+    return sorted(models, key=lambda model: model._meta.label_lower)
+
+
+def cached_count(queryset):
+    """Count the rows of a queryset, caching the result until an instance of one of the models
+    it reads is saved or deleted, or one of its many-to-many relations changes. Unfiltered tables
+    bigger than APPROXIMATE_COUNT_THRESHOLD are only estimated."""
+    try:
+        query_hash = hashlib.md5(str(queryset.query).encode('utf-8')).hexdigest()
+    except EmptyResultSet:
+        return 0
+    versions = '.'.join(str(model_version(model)) for model in counted_models(queryset))
+    key = 'count:{}:{}:{}:{}'.format(queryset.model._meta.label_lower, versions, cache_variant(), query_hash)
+    count = cache.get(key)
+    if count is None:
+        threshold = getattr(settings, 'APPROXIMATE_COUNT_THRESHOLD', None)
+        if threshold is not None and not queryset.query.where:
+            estimate = estimate_count(queryset)
+            if estimate is not None and estimate > threshold:
+                count = estimate
+        if count is None:
+            count = queryset.count()
+        cache.set(key, count, getattr(settings, 'COUNT_CACHE_TIMEOUT', 300))
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator taking its count from cached_count. Use it as the paginator_class of list views."""
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            return cached_count(self.object_list)
+        return len(self.object_list)
+
+
+class KnownCountPaginator(Paginator):
+    """Paginator told its count upfront (i.e.: by a denormalized counter), instead of counting."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+
+class KeysetPage:
+    """A page of a KeysetPaginator. Unlike django's Page, it knows whether there is a previous
+    or a next page by looking at the rows it fetched, not by counting the whole table."""
+
+    def __init__(self, object_list, position, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.position = position
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    # the position of pages reached backwards from the last one is counted from the end (-1 being
+    # the last page): their actual number is only known by counting the rows, so it is computed lazily
+    @property
+    def number(self):
+        if self.position < 0:
+            return self.paginator.num_pages + 1 + self.position
+        return self.position
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+class KeysetPaginator:
+    """Seek ("keyset") paginator: instead of an OFFSET, every page is fetched by looking for the
+    rows coming after (or before) the boundary row of the page the user comes from, so a deep page
+    costs as much as the first one. The boundaries travel in signed, opaque cursors."""
+
+    is_keyset = True
+    salt = 'product.utils.KeysetPaginator'
+
+    def __init__(self, object_list, per_page, ordering):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    # only computed if somebody (i.e.: a template) asks for it
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+    @cached_property
+    def num_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    def _seek(self, values, backwards):
+        # (f1, f2) after (v1, v2) means: f1 after v1, OR f1 equal to v1 AND f2 after v2
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != backwards else 'gt'
+            condition |= Q(**dict(equal, **{'{}__{}'.format(name, lookup): value}))
+            equal[name] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else '-' + field for field in self.ordering]
+
+    def cursor(self, direction, obj=None, number=None):
+        values = []
+        if obj is not None:
+            for field in self.ordering:
+                value = getattr(obj, field.lstrip('-'))
+                values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return signing.dumps({'d': direction, 'v': values, 'n': number}, salt=self.salt, compress=True)
+
+    def page(self, cursor=None):
+        if cursor:
+            try:
+                position = signing.loads(cursor, salt=self.salt)
+                direction, values, number = position['d'], position['v'], position['n']
+            except (signing.BadSignature, KeyError, TypeError) as error:
+                raise InvalidPage('Invalid cursor') from error
+        else:
+            direction, values, number = 'after', [], 1
+        backwards = direction in ('before', 'last')
+        if backwards:
+            queryset = self.object_list.order_by(*self._reversed_ordering())
+        else:
+            queryset = self.object_list.order_by(*self.ordering)
+        if values:
+            queryset = queryset.filter(self._seek(values, backwards))
+        # one more row than needed tells us if there is anything beyond this page
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            return KeysetPage(rows, number, self, has_previous=has_more, has_next=direction == 'before')
+        return KeysetPage(rows, number, self, has_previous=bool(values), has_next=has_more)
+
+
 class PageLinksMixin:
     """ This pagination mixin extends a View in tandem with ListView GCBV.
      You can see that the get_context_data method make a call to its 'super' method,
       because, as per prerequisite, that the ListView.get_context_data will be called."""
 
     page_kwarg = 'page'
+    paginator_class = CachedCountPaginator
+    # set keyset_ordering to a tuple of fields (ending with a unique one) to switch from
+    # the "?page=N" links to keyset pagination, navigated through "?cursor=..." links
+    keyset_ordering = None
+    cursor_kwarg = 'cursor'
 
     def _page_urls(self, page_number):
         return "?{pkw}={n}".format(
             pkw=self.page_kwarg,
             n=page_number)
 
+    def _cursor_urls(self, cursor):
+        if cursor is None:
+            return '?'
+        return "?{ckw}={cursor}".format(
+            ckw=self.cursor_kwarg,
+            cursor=cursor)
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.keyset_ordering is None:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidPage:
+            raise Http404('Invalid page.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def first_page(self, page):
+        if self.keyset_ordering is not None:
+            if page.has_previous():
+                return self._cursor_urls(None)
+            return None
         # don't show on first page
         if page.number > 1:
             return self._page_urls(1)
         return None
 
     def previous_page(self, page):
+        if self.keyset_ordering is not None:
+            # an empty page (i.e.: from a stale cursor) has no row to seek from: the first and last
+            # links are still there
+            if page.has_previous() and len(page):
+                return self._cursor_urls(page.paginator.cursor('before', page[0], page.position - 1))
+            return None
         if page.has_previous() and page.number > 2:
             return self._page_urls(
                 page.previous_page_number())
         return None
 
     def next_page(self, page):
+        if self.keyset_ordering is not None:
+            if page.has_next() and len(page):
+                return self._cursor_urls(page.paginator.cursor('after', page[len(page) - 1], page.position + 1))
+            return None
         last_page = page.paginator.num_pages
         if page.has_next() and page.number < last_page - 1:
             return self._page_urls(
@@ -30,6 +256,10 @@ class PageLinksMixin:
         return None
 
     def last_page(self, page):
+        if self.keyset_ordering is not None:
+            if page.has_next():
+                return self._cursor_urls(page.paginator.cursor('last', number=-1))
+            return None
         last_page = page.paginator.num_pages
         if page.number < last_page:
             return self._page_urls(last_page)
@@ -1,9 +1,37 @@
-from django.core.urlresolvers import reverse_lazy
-from django.views.generic import CreateView, DeleteView, DetailView, ListView, UpdateView
+from collections import OrderedDict
 
+from django.core.paginator import InvalidPage, Paginator
+from django.core.urlresolvers import reverse_lazy
+from django.http import Http404
+from django.utils.decorators import method_decorator
+from django.views.generic import CreateView, DeleteView, DetailView, ListView, TemplateView, UpdateView
+
+from blog.models import Post
+from core.cache import models_changed_at, object_version
+from core.decorators import conditional_page, list_validators
+from core.queries import query_budget
+from core.utils import PrefetchUnlessCachedMixin
+from .facets import get_index
 from .forms import LinkForm, ProductForm, TagForm
 from .models import Link, Product, Tag
-from .utils import PageLinksMixin
+from .utils import KnownCountPaginator, PageLinksMixin
+
+
+# the validators of the detail pages (see core.decorators.conditional_page): the version of the
+# object is bumped whenever the object, or anything shown on its page, changes
+def product_validators(request, slug):
+    product = Product.objects.filter(slug=slug).only('added_to_catalogue').first()
+    if product is None:
+        return None
+    return ([object_version(product)],
+            max(product.added_to_catalogue, models_changed_at(Product, Tag, Link, Post)))
+
+
+def tag_validators(request, slug):
+    tag = Tag.objects.filter(slug=slug).only('pk').first()
+    if tag is None:
+        return None
+    return [object_version(tag)], models_changed_at(Tag, Product, Post)
 
 
 class LinkCreate(CreateView):
@@ -27,7 +55,7 @@ class LinkDelete(DeleteView):
     # attribute because it changes from instance to instance. Instead, we can override the
     # get_success_url() method,
     def get_success_url(self):
-        return self.object.product.get_absolute_url()
+        return self.object.get_absolute_url()
 
 
 class ProductCreate(CreateView):
@@ -35,8 +63,18 @@ class ProductCreate(CreateView):
     template_name = 'product/product_form.html'
 
 
-class ProductDetail(DetailView):
+# the validators, the product and its three prefetched relations, plus the session and the user of
+# a logged-in visitor
+@query_budget(7)
+@method_decorator(conditional_page(product_validators), name='dispatch')
+class ProductDetail(PrefetchUnlessCachedMixin, DetailView):
+    # the detail template walks the tags, the links and the blog posts of the product more than once:
+    # prefetching them means every ".all" and ".count" in the template is served from memory, so the
+    # page costs the same number of queries however big the product's relations grow. When the
+    # rendered page is cached already, they are not fetched at all
+    fragment_name = 'product_detail'
     model = Product
+    prefetch = ('tags', 'link_set', 'post_set')
 
 
 class ProductDelete(DeleteView):
@@ -44,7 +82,9 @@ class ProductDelete(DeleteView):
     success_url = reverse_lazy('product_product_list')
 
 
+@method_decorator(conditional_page(list_validators(Product)), name='dispatch')
 class ProductList(PageLinksMixin, ListView):
+    keyset_ordering = ('added_to_catalogue', 'id')
     model = Product
     paginate_by = 5
 
@@ -66,11 +106,106 @@ class TagDelete(DeleteView):
     success_url = reverse_lazy('product_tag_list')
 
 
+# A tag may have thousands of products: its page shows them (and its posts) a page at a time,
+# each list with its own "?products=N" and "?posts=N" parameter. The counts come from the counters
+# of the tag, so the page runs the same few queries however popular the tag is.
+@method_decorator(conditional_page(tag_validators), name='dispatch')
 class TagDetail(DetailView):
     model = Tag
-
-
+    related_paginate_by = 10
+
+    def paginate_related(self, page_kwarg, queryset, count):
+        paginator = KnownCountPaginator(queryset, self.related_paginate_by, count)
+        try:
+            page = paginator.page(self.request.GET.get(page_kwarg, 1))
+        except InvalidPage:
+            raise Http404('Invalid page.')
+
+        # the links keep the position in the other list
+        def page_url(number):
+            query = self.request.GET.copy()
+            query[page_kwarg] = number
+            return '?' + query.urlencode()
+
+        return {
+            'count': count,
+            'page': page,
+            'previous_page_url': page_url(page.previous_page_number()) if page.has_previous() else None,
+            'next_page_url': page_url(page.next_page_number()) if page.has_next() else None,
+        }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        tag = self.object
+        context['products'] = self.paginate_related(
+            'products', tag.product_set.order_by('name', 'pk'), tag.product_count)
+        context['posts'] = self.paginate_related(
+            'posts', tag.post_set.order_by(*Post._meta.ordering, 'pk'), tag.post_count)
+        return context
+
+
+# Faceted browsing: the products (or posts) carrying all of the "?tag=" tags, and how many of them
+# carry each of the other tags. The intersections are computed by the in memory index of
+# product.facets; without a selection, the cloud shows the most used tags from their counters.
+class TagFacets(TemplateView):
+    template_name = 'product/tag_facets.html'
+    models = {'product': Product, 'post': Post}
+    cloud_size = 30
+    paginate_by = 10
+
+    def facet_url(self, slugs):
+        query = self.request.GET.copy()
+        query.setlist('tag', slugs)
+        query.pop('page', None)
+        return '?' + query.urlencode()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        kind = self.request.GET.get('kind', 'product')
+        if kind not in self.models:
+            raise Http404('Unknown kind.')
+        slugs = list(OrderedDict.fromkeys(self.request.GET.getlist('tag')))
+        selected = sorted(Tag.objects.filter(slug__in=slugs), key=lambda tag: slugs.index(tag.slug)) if slugs else []
+        if len(selected) != len(slugs):
+            raise Http404('Unknown tag.')
+
+        if selected:
+            index = get_index()
+            result = index.match(kind, [tag.pk for tag in selected])
+            counts = index.refinements(kind, result)
+            for tag in selected:
+                counts.pop(tag.pk, None)
+            cloud_ids = sorted(counts, key=counts.get, reverse=True)[:self.cloud_size]
+            cloud = sorted(Tag.objects.filter(pk__in=cloud_ids), key=lambda tag: (-counts[tag.pk], tag.name))
+            for tag in cloud:
+                tag.facet_count = counts[tag.pk]
+            paginator = Paginator(result, self.paginate_by)
+            try:
+                page = paginator.page(self.request.GET.get('page', 1))
+            except InvalidPage:
+                raise Http404('Invalid page.')
+            objects = self.models[kind].objects.in_bulk(page.object_list)
+            context.update({
+                'page_obj': page,
+                'object_list': [objects[pk] for pk in page.object_list if pk in objects],
+            })
+        else:
+            counter = '{}_count'.format(kind)
+            cloud = list(Tag.objects.filter(**{counter + '__gt': 0}).order_by('-' + counter, 'name')[:self.cloud_size])
+            for tag in cloud:
+                tag.facet_count = getattr(tag, counter)
+
+        for tag in cloud:
+            tag.facet_url = self.facet_url(slugs + [tag.slug])
+        for tag in selected:
+            tag.facet_url = self.facet_url([slug for slug in slugs if slug != tag.slug])
+        context.update({'kind': kind, 'selected': selected, 'cloud': cloud})
+        return context
+
+
+@method_decorator(conditional_page(list_validators(Tag)), name='dispatch')
 class TagList(PageLinksMixin, ListView):
+    keyset_ordering = ('name', 'id')
     paginate_by = 5
     model = Tag
 
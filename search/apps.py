@@ -0,0 +1,16 @@
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_delete, post_save
+
+
+class SearchConfig(AppConfig):
+    name = 'search'
+
+    def ready(self):
+        from .documents import DOCUMENTS
+        from .signals import index_object, unindex_object
+
+        # the index follows every change to the searched objects
+        for app_label, model_name, _, _ in DOCUMENTS.values():
+            model = apps.get_model(app_label, model_name)
+            post_save.connect(index_object, sender=model)
+            post_delete.connect(unindex_object, sender=model)
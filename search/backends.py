@@ -0,0 +1,141 @@
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+from .documents import DOCUMENTS, iter_documents
+
+
+class BaseSearchBackend:
+    """Interface of the search backends: pick one with the SEARCH_BACKEND setting.
+    Documents are identified by their kind (see search.documents) and the pk of their object.
+    A backend keeps the index of the objects of one database: the one of the "using" alias."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def install(self):
+        """Create the storage of the index."""
+        raise NotImplementedError
+
+    def uninstall(self):
+        raise NotImplementedError
+
+    def index(self, kind, documents):
+        """Add, or replace, (pk, title, body) documents."""
+        raise NotImplementedError
+
+    def remove(self, kind, pks):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def count(self, query):
+        """Number of documents matching the query."""
+        raise NotImplementedError
+
+    def search(self, query, offset, limit):
+        """(kind, pk) of the matching documents, best first."""
+        raise NotImplementedError
+
+    def update(self, apps, kind, pks, batch_size=500):
+        """Index again the objects of a kind with the given pks (i.e.: after a bulk_create, which
+        sends no post_save signal). Keep batch_size below 999, the limit of SQLite to the query
+        parameters."""
+        pks = sorted(pks)
+        for start in range(0, len(pks), batch_size):
+            self.index(kind, list(iter_documents(apps, kind, self.using, pks[start:start + batch_size])))
+
+    def rebuild(self, apps, batch_size=1000):
+        self.clear()
+        for kind in DOCUMENTS:
+            batch = []
+            for document in iter_documents(apps, kind, self.using):
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    self.index(kind, batch)
+                    batch = []
+            self.index(kind, batch)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Index stored in an FTS5 virtual table of the SQLite database. The rowid of a document
+    encodes its kind and its pk, so that replacing or removing it is a primary key lookup."""
+
+    table = 'search_document'
+    kinds = sorted(DOCUMENTS)
+    # a match in the title weighs as much as ten in the body
+    ranking = 'bm25(search_document, 10.0, 1.0)'
+
+    def _rowid(self, kind, pk):
+        return pk * len(self.kinds) + self.kinds.index(kind)
+
+    def _document(self, rowid):
+        pk, kind = divmod(rowid, len(self.kinds))
+        return self.kinds[kind], pk
+
+    # every word of the query must match, the last one as a prefix (to search as you type).
+    # The words are quoted, so that nothing the user types is taken for FTS5 syntax
+    def match_expression(self, query):
+        words = re.findall(r'\w+', query)
+        if not words:
+            return None
+        return ' '.join('"{}"'.format(word) for word in words) + '*'
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def install(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {} "
+                           "USING fts5(title, body, tokenize='porter unicode61')".format(self.table))
+
+    def uninstall(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(self.table))
+
+    def index(self, kind, documents):
+        rows = [(self._rowid(kind, pk), title, body) for pk, title, body in documents]
+        if rows:
+            with self.connection.cursor() as cursor:
+                cursor.executemany('DELETE FROM {} WHERE rowid = %s'.format(self.table), [row[:1] for row in rows])
+                cursor.executemany('INSERT INTO {} (rowid, title, body) VALUES (%s, %s, %s)'.format(self.table), rows)
+
+    def remove(self, kind, pks):
+        with self.connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM {} WHERE rowid = %s'.format(self.table),
+                               [(self._rowid(kind, pk),) for pk in pks])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(self.table))
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if expression is None:
+            return 0
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM {0} WHERE {0} MATCH %s'.format(self.table), [expression])
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT rowid FROM {0} WHERE {0} MATCH %s ORDER BY {1} LIMIT %s OFFSET %s'.format(
+                self.table, self.ranking), [expression, limit, offset])
+            return [self._document(rowid) for rowid, in cursor.fetchall()]
+
+
+_backends = {}
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    if using not in _backends:
+        backend_class = import_string(getattr(settings, 'SEARCH_BACKEND', 'search.backends.SQLiteFTSBackend'))
+        _backends[using] = backend_class(using)
+    return _backends[using]
@@ -0,0 +1,34 @@
+# The objects we search through. Every kind of document is read from a model: its title
+# (ranked higher) and its body come from the given fields.
+DOCUMENTS = {
+    'product': ('product', 'Product', 'name', 'description'),
+    'tag': ('product', 'Tag', 'name', None),
+    'post': ('blog', 'Post', 'title', 'text'),
+}
+
+
+def document_kind(model):
+    for kind, (app_label, model_name, _, _) in DOCUMENTS.items():
+        if (model._meta.app_label, model._meta.object_name) == (app_label, model_name):
+            return kind
+    return None
+
+
+def document(kind, obj):
+    _, _, title_field, body_field = DOCUMENTS[kind]
+    body = getattr(obj, body_field) if body_field else ''
+    return obj.pk, getattr(obj, title_field), body or ''
+
+
+def iter_documents(apps, kind, using, pks=None):
+    """Stream the (pk, title, body) documents of a kind stored in the "using" database, all of them
+    or those of the given pks. apps is the app registry: the real one, or the historical one of a
+    migration."""
+    app_label, model_name, title_field, body_field = DOCUMENTS[kind]
+    model = apps.get_model(app_label, model_name)
+    fields = ['pk', title_field] + ([body_field] if body_field else [])
+    objects = model.objects.using(using).order_by()
+    if pks is not None:
+        objects = objects.filter(pk__in=pks)
+    for row in objects.values_list(*fields).iterator():
+        yield row[0], row[1], (row[2] or '') if body_field else ''
@@ -0,0 +1,17 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from search.backends import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Index again all the products, tags and blog posts (i.e.: after a bulk import).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='The database whose objects are indexed again. Defaults to "default".')
+
+    def handle(self, *args, **options):
+        with transaction.atomic(using=options['database']):
+            get_backend(options['database']).rebuild(apps)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def install_index(apps, schema_editor):
+    from search.backends import get_backend
+    # the index goes to the database being migrated, next to the objects it is built from
+    backend = get_backend(schema_editor.connection.alias)
+    backend.install()
+    backend.rebuild(apps)
+
+
+def uninstall_index(apps, schema_editor):
+    from search.backends import get_backend
+    get_backend(schema_editor.connection.alias).uninstall()
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ('blog', '0003_post_slug_index'),
+        ('product', '0003_auto_20261018_1806'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_index, uninstall_index),
+    ]
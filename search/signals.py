@@ -0,0 +1,13 @@
+# Receivers keeping the search index in step with the searched objects: they are connected to
+# their signals by SearchConfig.ready
+from .backends import get_backend
+from .documents import document, document_kind
+
+
+def index_object(sender, instance, using, **kwargs):
+    kind = document_kind(sender)
+    get_backend(using).index(kind, [document(kind, instance)])
+
+
+def unindex_object(sender, instance, using, **kwargs):
+    get_backend(using).remove(document_kind(sender), [instance.pk])
@@ -0,0 +1,86 @@
+from datetime import date
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from blog.models import Post
+from product.models import Product, Tag
+from .backends import get_backend
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        self.backend = get_backend()
+
+    def test_saved_objects_are_indexed(self):
+        Tag.objects.create(name='gardening', slug='gardening')
+        product = Product.objects.create(name='Shovel', slug='shovel', description='Digs holes')
+        self.assertEqual(self.backend.search('shovel', 0, 10), [('product', product.pk)])
+        # the last word is a prefix, and the words are stemmed
+        self.assertEqual(self.backend.count('garden'), 1)
+        self.assertEqual(self.backend.count('dig holes'), 1)
+
+        product.description = 'Moves earth'
+        product.save()
+        self.assertEqual(self.backend.count('hole'), 0)
+        self.assertEqual(self.backend.count('earth'), 1)
+
+    def test_deleted_objects_are_removed(self):
+        product = Product.objects.create(name='Shovel', slug='shovel')
+        product.delete()
+        self.assertEqual(self.backend.count('shovel'), 0)
+
+    def test_title_matches_rank_first(self):
+        post = Post.objects.create(title='A day in the garden', slug='garden', text='Weeding',
+                                   publication_date=date(2017, 1, 1))
+        product = Product.objects.create(name='Rake', slug='rake',
+                                         description='For the garden, and for the garden only')
+        self.assertEqual(self.backend.search('garden', 0, 10), [('post', post.pk), ('product', product.pk)])
+
+    def test_query_syntax_is_not_interpreted(self):
+        Product.objects.create(name='Shovel', slug='shovel')
+        self.assertEqual(self.backend.count('shovel OR "NEAR('), 0)
+        self.assertEqual(self.backend.count('***'), 0)
+
+    def test_rebuild(self):
+        from django.apps import apps
+        Product.objects.create(name='Shovel', slug='shovel')
+        self.backend.clear()
+        self.assertEqual(self.backend.count('shovel'), 0)
+        self.backend.rebuild(apps)
+        self.assertEqual(self.backend.count('shovel'), 1)
+
+
+class SearchDatabaseTests(TestCase):
+    multi_db = True
+
+    def test_every_database_has_its_own_index(self):
+        from django.apps import apps
+        Product.objects.using('replica1').create(name='Shovel', slug='shovel')
+        # the migration installed an index in the replica too, and its objects are indexed there
+        self.assertEqual(get_backend('replica1').count('shovel'), 1)
+        self.assertEqual(get_backend().count('shovel'), 0)
+        get_backend().rebuild(apps)
+        self.assertEqual(get_backend().count('shovel'), 0)
+
+
+class SearchViewTests(TestCase):
+
+    def test_results_are_paginated(self):
+        for n in range(15):
+            Product.objects.create(name='Shovel {}'.format(n), slug='shovel-{}'.format(n))
+        response = self.client.get(reverse('search'), {'q': 'shovel'})
+        self.assertEqual(len(response.context['result_list']), 10)
+        self.assertEqual(response.context['paginator'].count, 15)
+        self.assertEqual(response.context['next_page_url'], None)
+        self.assertEqual(response.context['last_page_url'], '?q=shovel&page=2')
+
+        response = self.client.get(reverse('search'), {'q': 'shovel', 'page': 2})
+        self.assertEqual(len(response.context['result_list']), 5)
+        self.assertContains(response, 'Shovel', count=5)
+
+    def test_empty_query(self):
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['result_list']), 0)
@@ -0,0 +1,7 @@
+from django.conf.urls import url
+
+from .views import Search
+
+urlpatterns = [
+    url(r'^$', Search.as_view(), name='search'),
+]
@@ -0,0 +1,54 @@
+from django.apps import apps
+from django.core.paginator import Paginator
+from django.utils.http import urlencode
+from django.views.generic import ListView
+
+from product.utils import PageLinksMixin
+from .backends import get_backend
+from .documents import DOCUMENTS
+
+
+class SearchResults:
+    """The ranked matches of a query, as a lazy sequence for the paginator: every page is a
+    query to the search backend, plus one query per kind of object to load them."""
+
+    def __init__(self, query):
+        self.query = query
+        self.backend = get_backend()
+
+    def __len__(self):
+        return self.backend.count(self.query)
+
+    def __getitem__(self, page):
+        hits = self.backend.search(self.query, page.start, page.stop - page.start)
+        objects = {}
+        for kind in {kind for kind, _ in hits}:
+            app_label, model_name, _, _ = DOCUMENTS[kind]
+            pks = [pk for hit_kind, pk in hits if hit_kind == kind]
+            for pk, obj in apps.get_model(app_label, model_name).objects.in_bulk(pks).items():
+                obj.search_kind = kind
+                objects[kind, pk] = obj
+        return [objects[hit] for hit in hits if hit in objects]
+
+
+class Search(PageLinksMixin, ListView):
+    context_object_name = 'result_list'
+    # the backend does the counting, not cached_count
+    paginator_class = Paginator
+    paginate_by = 10
+    template_name = 'search/search_results.html'
+
+    def get_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_queryset(self):
+        return SearchResults(self.get_query())
+
+    # the page links must carry the query along
+    def _page_urls(self, page_number):
+        return '?' + urlencode({'q': self.get_query(), self.page_kwarg: page_number})
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.get_query()
+        return context